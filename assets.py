@@ -0,0 +1,142 @@
+"""Content-addressed image assets, referenced from the component HTML by URL.
+
+Files are published into ``ASSET_DIR`` under a name derived from their
+SHA-256, so an asset URL never changes meaning and browsers can cache it
+indefinitely. By default the directory is served through Streamlit's static
+route (``server.enableStaticServing``), which sends Streamlit's own cache
+headers; the immutable ones then have to come from a reverse proxy (see the
+README). Setting ``GALLERY_ASSET_PORT`` starts a small local asset server
+instead, which answers with long-lived immutable cache headers itself.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from thumbnails import file_hash
+
+ASSET_DIR = os.environ.get("GALLERY_ASSET_DIR", os.path.join("static", "assets"))
+ASSET_URL = os.environ.get("GALLERY_ASSET_URL", "/app/static/assets")
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+PALETTE_CHUNK_SIZE = 100
+
+_server_lock = threading.Lock()
+_servers = {}
+
+
+def _tmp_path(target):
+    # Sessions are threads of one process, so the pid alone is not unique
+    return f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def publish_asset(path, digest=None):
+    """Copy a file into the asset directory under its content hash and return the asset name
+
+    Pass the file's SHA-256 when it is already known to skip hashing it again.
+    """
+    name = (digest or file_hash(path))[:32] + os.path.splitext(path)[1].lower()
+    target = os.path.join(ASSET_DIR, name)
+    if not os.path.exists(target):
+        os.makedirs(ASSET_DIR, exist_ok=True)
+        # A copy, not a hard link: editing the source in place must not change a published asset
+        tmp_path = _tmp_path(target)
+        shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, target)
+    return name
+
+
+def publish_bytes(data, ext):
+    """Write in-memory content into the asset directory under its hash and return the asset name"""
+    name = hashlib.sha256(data).hexdigest()[:32] + ext
+    target = os.path.join(ASSET_DIR, name)
+    if not os.path.exists(target):
+        os.makedirs(ASSET_DIR, exist_ok=True)
+        tmp_path = _tmp_path(target)
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, target)
+    return name
+
+
+def asset_url(name, base_url=ASSET_URL):
+    """URL of a published asset"""
+    return f"{base_url.rstrip('/')}/{name}"
+
+
+def publish_catalog_state(artworks, images, couch_url, base_url=ASSET_URL, chunk_size=PALETTE_CHUNK_SIZE):
+    """Publish the component's palette state and return its asset name
+
+    images maps image path -> {"palette": url, "wall": url}; artworks without
+    an entry are left out. Palette entries are split into fixed-size chunks
+    published as JSON assets. The state itself (chunk URLs plus the first
+    chunk inline) is published too, so the component only needs its URL.
+    """
+    available = [artwork for artwork in artworks if artwork["image_path"] in images]
+    chunks = []
+    for start in range(0, len(available), chunk_size):
+        chunk_artworks = available[start:start + chunk_size]
+        chunks.append({
+            "artworks": chunk_artworks,
+            "images": {artwork["image_path"]: images[artwork["image_path"]] for artwork in chunk_artworks},
+        })
+    state = {
+        "total": len(available),
+        "chunk_size": chunk_size,
+        "chunks": [asset_url(publish_bytes(json.dumps(chunk).encode(), ".json"), base_url) for chunk in chunks],
+        "first_chunk": chunks[0] if chunks else None,
+        "couch_url": couch_url,
+    }
+    return publish_bytes(json.dumps(state).encode(), ".json")
+
+
+def local_server_url(port):
+    """Base URL of the local asset server on a port"""
+    return f"http://localhost:{port}/assets"
+
+
+class AssetRequestHandler(SimpleHTTPRequestHandler):
+    """Serves published assets with immutable cache headers"""
+
+    def send_response(self, code, message=None):
+        self._status = code
+        super().send_response(code, message)
+
+    def end_headers(self):
+        if getattr(self, "_status", None) == 200:
+            self.send_header("Cache-Control", CACHE_CONTROL)
+            self.send_header("ETag", '"%s"' % os.path.splitext(os.path.basename(self.path))[0])
+        self.send_header("Access-Control-Allow-Origin", "*")
+        super().end_headers()
+
+    def translate_path(self, path):
+        path = path.split("?", 1)[0].split("#", 1)[0]
+        if not path.startswith("/assets/"):
+            return ""
+        # Asset names are flat hashes, so anything with a separator is rejected
+        name = path[len("/assets/"):]
+        if not name or "/" in name or name.startswith("."):
+            return ""
+        return os.path.join(self.directory, name)
+
+    def list_directory(self, path):
+        self.send_error(404)
+        return None
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_asset_server(port, host="0.0.0.0"):
+    """Start (once per process) a background asset server and return its base URL"""
+    with _server_lock:
+        if port not in _servers:
+            os.makedirs(ASSET_DIR, exist_ok=True)
+            handler = partial(AssetRequestHandler, directory=os.path.abspath(ASSET_DIR))
+            server = ThreadingHTTPServer((host, port), handler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="asset-server", daemon=True).start()
+            _servers[port] = server
+    return local_server_url(port)
@@ -0,0 +1,131 @@
+"""Headless batch processing of saved designs.
+
+    python -m gallery_wall_designer batch [--storage URL] [--workers N]
+        [--render DIR] [--scale S] [--format webp|png] [--output report.jsonl]
+
+Streams every record in ``gallery_designs`` from storage and, across a
+process pool, re-prices it against the current catalog, validates its layout
+and optionally renders a preview. Each worker receives the catalog (and, when
+rendering, the asset manifest) once, when it starts, and designs travel in
+small chunks. Only a bounded number of chunks is in flight at a time, so memory
+stays flat however long the design history is. One JSON line per design is
+written to the report, and a summary goes to stderr.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+
+from designs import design_placements, design_wall, resolve_design
+from layout import couch_rect
+from spatial import describe_problems, validate_layout
+from storage import get_storage
+
+CHUNK_SIZE = 32
+
+_catalog = {}
+_manifest = None
+
+
+def _init_worker(artworks, manifest):
+    global _catalog, _manifest
+    _catalog = {artwork["id"]: artwork for artwork in artworks}
+    _manifest = manifest
+
+
+def process_design(design, catalog, render_dir=None, scale=0.5, fmt="webp", manifest=None):
+    """Re-price, validate and optionally render one saved design; returns a report dict"""
+    # Current catalog fields (price, size, image) at the saved positions
+    placements = design_placements(design)
+    pieces, missing = resolve_design({"placements": placements}, catalog)
+    wall_width, wall_height = design_wall(design)
+
+    stored_cost = design.get("total_cost", 0)
+    current_cost = sum(piece.get("price", 0) for piece in pieces)
+    problems = validate_layout(pieces, wall_width, wall_height, (couch_rect(wall_width, wall_height),))
+    report = {
+        "id": design.get("id"),
+        "name": design.get("name"),
+        "pieces": len(pieces),
+        "missing_artworks": missing,
+        "stored_cost": stored_cost,
+        "current_cost": current_cost,
+        "price_change": current_cost - stored_cost,
+        "problems": len(problems),
+        "problem_summary": describe_problems(problems),
+    }
+    if render_dir:
+        from render import render_wall
+
+        path = os.path.join(render_dir, f"{design.get('id')}.{fmt}")
+        with open(path, "wb") as f:
+            f.write(render_wall(pieces, scale, fmt.upper(), wall_width, wall_height, manifest))
+        report["preview"] = path
+    return report
+
+
+def _process_chunk(designs, render_dir, scale, fmt):
+    return [process_design(design, _catalog, render_dir, scale, fmt, _manifest) for design in designs]
+
+
+def run_batch(storage, workers=None, render_dir=None, scale=0.5, fmt="webp", chunk_size=CHUNK_SIZE):
+    """Yield a report dict per saved design, processed across a process pool
+
+    Reports arrive in completion order, not storage order.
+    """
+    artworks = storage.load_artworks()
+    manifest = None
+    if render_dir:
+        from manifest import build_manifest
+
+        os.makedirs(render_dir, exist_ok=True)
+        manifest = build_manifest(artwork["image_path"] for artwork in artworks)
+    workers = workers or os.cpu_count() or 1
+    designs = iter(storage.iter_designs())
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(artworks, manifest)) as pool:
+        pending = set()
+        while True:
+            while len(pending) < 2 * workers:
+                chunk = list(islice(designs, chunk_size))
+                if not chunk:
+                    break
+                pending.add(pool.submit(_process_chunk, chunk, render_dir, scale, fmt))
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m gallery_wall_designer batch",
+                                     description="Re-price, validate and render every saved design")
+    parser.add_argument("--storage", help="storage URL (default: GALLERY_STORAGE or artwork_database.json)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--render", metavar="DIR", help="write a preview image per design into DIR")
+    parser.add_argument("--scale", type=float, default=0.5, help="preview scale of the 900x500 wall (default: 0.5)")
+    parser.add_argument("--format", choices=("webp", "png"), default="webp", help="preview format")
+    parser.add_argument("--output", help="write the JSONL report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    started = time.time()
+    totals = {"designs": 0, "repriced": 0, "with_problems": 0, "with_missing": 0}
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for report in run_batch(get_storage(args.storage), args.workers, args.render, args.scale, args.format):
+            out.write(json.dumps(report) + "\n")
+            totals["designs"] += 1
+            totals["repriced"] += report["price_change"] != 0
+            totals["with_problems"] += report["problems"] > 0
+            totals["with_missing"] += bool(report["missing_artworks"])
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"{totals['designs']} designs in {time.time() - started:.1f}s: {totals['repriced']} repriced, "
+          f"{totals['with_problems']} with layout problems, {totals['with_missing']} with missing artworks",
+          file=sys.stderr)
+    return 0
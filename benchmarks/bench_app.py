@@ -0,0 +1,232 @@
+"""Time the app's hot paths on synthetic catalogs and designs, and compare runs.
+
+    python benchmarks/bench_app.py [--catalog-sizes 10 1000 10000 100000] [--design-sizes 1 20 100 500]
+        [--designs 1000] [--repeat 3] [--output results.json]
+    python benchmarks/bench_app.py compare baseline.json results.json [--threshold 0.2]
+
+Covered, per catalog size or design size:
+
+- ``storage.load``, ``storage.save``, ``storage.add_design`` for the JSON and
+  SQLite backends (``load`` reads everything the app loads: the catalog
+  and all designs; ``save`` is the full rewrite behind migration and
+  ``designs.py compact``), plus ``storage.page_designs`` and
+  ``storage.save_then_page``: one page of the design picker, and a save
+  followed by the next page
+- ``palette.publish``: publishing the component's palette state, with the
+  bytes published (the successor of the generated component HTML)
+- ``wall.payload``: the full wall state sent to the component, with its size
+- ``layout.arrange``: each auto-arrange strategy on the default wall
+- ``design.resolve`` and ``design.index_*``: loading a saved design against the
+  catalog, and building/paging the saved-design index
+
+Results are written as JSON: ``{"meta": {...}, "results": [{"name",
+"params", "best_ms", "median_ms", "bytes"}]}``. ``compare`` matches results
+by name and params, and exits with status 1 when a time grew by more than the
+threshold or a payload grew at all.
+"""
+import argparse
+import atexit
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Published palette assets go to a scratch directory, never the app's
+_scratch = tempfile.mkdtemp(prefix="gallery-bench-")
+atexit.register(shutil.rmtree, _scratch, True)
+os.environ["GALLERY_ASSET_DIR"] = os.path.join(_scratch, "assets")
+
+import layout  # noqa: E402
+from assets import ASSET_DIR, publish_catalog_state  # noqa: E402
+from designs import DesignIndex, resolve_design  # noqa: E402
+from storage import JsonStorage, SqliteStorage  # noqa: E402
+from synthetic import image_urls, placed, synthetic_catalog, synthetic_design, synthetic_designs  # noqa: E402
+from wall_state import wall_version  # noqa: E402
+
+DESIGN_PIECES = 20  # pieces per design in the stored design history
+NOISE_MS = 0.05  # time differences below this are never reported as regressions
+
+
+def measure(fn, repeat, setup=None):
+    """Run fn once untimed, then repeat times; returns (timings in ms, last return value)"""
+    timings = []
+    for run in range(repeat + 1):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        value = fn()
+        if run:
+            timings.append((time.perf_counter() - start) * 1000)
+    return timings, value
+
+
+def record(results, name, params, timings, size=None):
+    entry = {"name": name, "params": params, "best_ms": round(min(timings), 4),
+             "median_ms": round(statistics.median(timings), 4)}
+    if size is not None:
+        entry["bytes"] = size
+    results.append(entry)
+    shown = ", ".join(f"{key}={value}" for key, value in params.items())
+    print(f"{name:<20} {shown:<40} {entry['best_ms']:>10.2f} {entry['median_ms']:>10.2f}"
+          + (f" {size:>12}" if size is not None else ""))
+
+
+def bench_storage(results, catalog, designs, repeat):
+    data = {"artworks": catalog, "gallery_designs": designs}
+    extra = synthetic_design(catalog, DESIGN_PIECES, seed=-1, design_id="bench-extra")
+    params = {"artworks": len(catalog), "designs": len(designs)}
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = {
+            # Never compact in the background while timing
+            "json": JsonStorage(os.path.join(tmp, "bench.json"), compact_threshold=1 << 62),
+            "sqlite": SqliteStorage(os.path.join(tmp, "bench.db")),
+        }
+        for backend, storage in backends.items():
+            timings, _ = measure(lambda: storage.save(data), repeat)
+            record(results, "storage.save", dict(params, backend=backend), timings)
+            timings, _ = measure(storage.load, repeat)
+            record(results, "storage.load", dict(params, backend=backend), timings)
+            timings, _ = measure(lambda: storage.add_design(dict(extra)), repeat, setup=lambda: storage.save(data))
+            record(results, "storage.add_design", dict(params, backend=backend), timings)
+            for search in (False, True):
+                timings, _ = measure(lambda: storage.page_designs("blue" if search else None, "total_cost"), repeat)
+                record(results, "storage.page_designs", dict(params, backend=backend, search=search), timings)
+            # A save as the next rerun sees it: the new design has to show up in the picker
+            timings, _ = measure(lambda: (storage.add_design(dict(extra)), storage.page_designs()), repeat)
+            record(results, "storage.save_then_page", dict(params, backend=backend), timings)
+
+
+def bench_palette(results, catalog, repeat):
+    images = image_urls(catalog)
+    timings, name = measure(lambda: publish_catalog_state(catalog, images, "/app/static/assets/couch.webp"), repeat)
+    with open(os.path.join(ASSET_DIR, name)) as f:
+        state = json.load(f)
+    size = os.path.getsize(os.path.join(ASSET_DIR, name))
+    size += sum(os.path.getsize(os.path.join(ASSET_DIR, url.rsplit("/", 1)[1])) for url in state["chunks"])
+    record(results, "palette.publish", {"artworks": len(catalog)}, timings, size)
+
+
+def bench_design(results, catalog, by_id, pieces, repeat):
+    design = synthetic_design(catalog, pieces)
+    wall = placed(catalog, design)
+    params = {"pieces": len(wall), "artworks": len(catalog)}
+
+    timings, _ = measure(lambda: resolve_design(design, by_id), repeat)
+    record(results, "design.resolve", params, timings)
+
+    payload = lambda: json.dumps({"version": wall_version(wall), "artworks": wall, "images": image_urls(wall)})  # noqa: E731
+    timings, body = measure(payload, repeat)
+    record(results, "wall.payload", {"pieces": len(wall)}, timings, len(body.encode()))
+
+    for strategy in layout.STRATEGIES:
+        timings, _ = measure(lambda: layout.arrange(wall, strategy), repeat)
+        record(results, "layout.arrange", {"pieces": len(wall), "strategy": strategy}, timings)
+
+
+def bench_design_index(results, designs, repeat):
+    params = {"designs": len(designs)}
+    timings, index = measure(lambda: DesignIndex(designs), repeat)
+    record(results, "design.index_build", params, timings)
+    timings, _ = measure(lambda: index.page(None, "created_date", True, 0), repeat)
+    record(results, "design.index_page", dict(params, search=False), timings)
+    timings, _ = measure(lambda: index.page("blue", "total_cost", False, 1), repeat)
+    record(results, "design.index_page", dict(params, search=True), timings)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    results = []
+    print(f"{'benchmark':<20} {'params':<40} {'best ms':>10} {'median ms':>10} {'bytes':>12}")
+    for count in args.catalog_sizes:
+        catalog = synthetic_catalog(count)
+        designs = synthetic_designs(catalog, args.designs, DESIGN_PIECES)
+        bench_storage(results, catalog, designs, args.repeat)
+        bench_palette(results, catalog, args.repeat)
+    largest = synthetic_catalog(max(args.catalog_sizes))
+    by_id = {artwork["id"]: artwork for artwork in largest}
+    for pieces in args.design_sizes:
+        bench_design(results, largest, by_id, pieces, args.repeat)
+    bench_design_index(results, synthetic_designs(largest, args.designs, DESIGN_PIECES), args.repeat)
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold):
+    """Print each result against the baseline; returns the number of regressions"""
+    def key(entry):
+        return entry["name"], json.dumps(entry["params"], sort_keys=True)
+
+    before = {key(entry): entry for entry in baseline["results"]}
+    regressions = 0
+    print(f"{'benchmark':<20} {'params':<40} {'base ms':>10} {'new ms':>10} {'ratio':>7}")
+    for entry in current["results"]:
+        old = before.get(key(entry))
+        shown = ", ".join(f"{name}={value}" for name, value in entry["params"].items())
+        if old is None:
+            print(f"{entry['name']:<20} {shown:<40} {'-':>10} {entry['best_ms']:>10.2f}    new")
+            continue
+        ratio = entry["best_ms"] / old["best_ms"] if old["best_ms"] else 1.0
+        slower = ratio > 1 + threshold and entry["best_ms"] - old["best_ms"] > NOISE_MS
+        bigger = entry.get("bytes", 0) > old.get("bytes", 0)
+        flags = " SLOWER" * slower + (f" BYTES {old.get('bytes')} -> {entry.get('bytes')}" if bigger else "")
+        regressions += slower or bigger
+        print(f"{entry['name']:<20} {shown:<40} {old['best_ms']:>10.2f} {entry['best_ms']:>10.2f} {ratio:>7.2f}{flags}")
+    print(f"{regressions} regression(s) against {baseline['meta'].get('git') or 'baseline'}")
+    return regressions
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["compare"]:
+        parser = argparse.ArgumentParser(prog="bench_app.py compare", description="Compare two result files")
+        parser.add_argument("baseline")
+        parser.add_argument("current")
+        parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown of best times (0.2 = 20%%)")
+        args = parser.parse_args(argv[1:])
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        return 1 if compare(baseline, current, args.threshold) else 0
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--catalog-sizes", type=int, nargs="+", default=[10, 1000, 10000, 100000])
+    parser.add_argument("--design-sizes", type=int, nargs="+", default=[1, 20, 100, 500])
+    parser.add_argument("--designs", type=int, default=1000, help="saved designs stored with each catalog")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write results as JSON here")
+    args = parser.parse_args(argv)
+    report = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
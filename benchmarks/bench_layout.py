@@ -0,0 +1,61 @@
+"""Time the auto-arrange strategies as the number of pieces grows.
+
+    python benchmarks/bench_layout.py [--sizes 10 100 500] [--repeat 5]
+
+The wall is scaled with the piece count so that every strategy has room to
+place most pieces; each result is checked for overlaps before it is timed.
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import layout  # noqa: E402
+
+
+def synthetic_pieces(count, seed=0):
+    rng = random.Random(seed)
+    return [{"id": i, "width": rng.randint(8, 40), "height": rng.randint(8, 40)} for i in range(count)]
+
+
+def wall_for(pieces):
+    """A wall about three times the pieces' total area, 2:1 wide, plus room for the couch"""
+    area = sum(w * h for w, h in map(layout.piece_size, pieces)) * 3
+    height = max(layout.WALL_HEIGHT, int(math.sqrt(area / 2)))
+    width = max(layout.WALL_WIDTH, 2 * height)
+    return width, height, layout.couch_rect(width, height)
+
+
+def count_overlaps(pieces, result):
+    sizes = {piece["id"]: layout.piece_size(piece) for piece in pieces}
+    rects = [(x, y, *sizes[i]) for i, (x, y) in result.placements.items()]
+    return sum(layout.rects_overlap(a, b) for i, a in enumerate(rects) for b in rects[i + 1:])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 100, 200, 500, 1000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'pieces':>7} {'strategy':<18} {'placed':>7} {'best ms':>9}")
+    for count in args.sizes:
+        pieces = synthetic_pieces(count)
+        width, height, couch = wall_for(pieces)
+        for name, strategy in layout.STRATEGIES.items():
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                result = strategy(pieces, wall_width=width, wall_height=height, obstacles=(couch,))
+                timings.append(time.perf_counter() - start)
+            if count <= 1000 and count_overlaps(pieces, result):
+                raise SystemExit(f"{name} produced overlapping pieces for {count} pieces")
+            print(f"{count:>7} {name:<18} {len(result.placements):>7} {min(timings) * 1000:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Deterministic synthetic catalogs and saved designs for the benchmarks.
+
+Records have the same shape as ``artwork_database.json``: artworks with the
+catalog fields, and compact designs that reference them by id. Image paths
+are fake; benchmarks that need image URLs build them with ``image_urls``.
+"""
+import random
+from datetime import datetime, timedelta
+
+from thumbnails import VARIANTS
+
+STYLES = ("Abstract", "Botanical", "Geometric", "Landscape", "Portrait", "Seascape", "Still Life", "Urban")
+WORDS = ("Blue", "Morning", "Harbor", "Quiet", "Field", "City", "Light", "Study", "Garden", "Storm",
+         "Golden", "Window", "River", "Lines", "Summer", "Forest", "Night", "Portrait", "Bloom", "Stone")
+
+
+def synthetic_catalog(count, seed=0):
+    """count artwork dicts with varied sizes, prices, styles and titles"""
+    rng = random.Random(seed)
+    return [
+        {
+            "id": i + 1,
+            "title": " ".join(rng.sample(WORDS, rng.randint(1, 3))),
+            "artist": f"Artist {rng.randint(1, max(1, count // 10))}",
+            "width": rng.randint(8, 48),
+            "height": rng.randint(8, 40),
+            "frame_width": rng.choice((0, 1, 2, 3)),
+            "image_path": f"Art/synthetic/{i + 1}.webp",
+            "style": rng.choice(STYLES),
+            "price": rng.randint(2, 200) * 5,
+        }
+        for i in range(count)
+    ]
+
+
+def synthetic_design(catalog, pieces, seed=0, design_id=None):
+    """A compact saved design hanging `pieces` distinct artworks from the catalog"""
+    rng = random.Random(seed)
+    chosen = rng.sample(catalog, min(pieces, len(catalog)))
+    created = datetime(2024, 1, 1) + timedelta(minutes=rng.randint(0, 1_000_000))
+    return {
+        "id": design_id or f"design-{seed}",
+        "name": " ".join(rng.sample(WORDS, 2)) + f" {seed}",
+        "created_date": created.isoformat(),
+        "placements": [[artwork["id"], rng.randint(0, 800), rng.randint(0, 400)] for artwork in chosen],
+        "total_cost": sum(artwork["price"] for artwork in chosen),
+    }
+
+
+def synthetic_designs(catalog, count, pieces, seed=0):
+    """count designs of `pieces` artworks each"""
+    return [synthetic_design(catalog, pieces, seed + i, f"design-{seed + i}") for i in range(count)]
+
+
+def placed(catalog, design):
+    """Catalog dicts of a design at their saved positions, like a loaded wall"""
+    by_id = {artwork["id"]: artwork for artwork in catalog}
+    return [dict(by_id[key], wall_x=x, wall_y=y) for key, x, y in design["placements"]]
+
+
+def image_urls(artworks, base_url="/app/static/assets"):
+    """Thumbnail URLs of every variant per image path, shaped like the app's get_image_urls"""
+    return {
+        artwork["image_path"]: {
+            variant: f"{base_url}/{artwork['id'] * len(VARIANTS) + i:032x}.webp" for i, variant in enumerate(VARIANTS)
+        }
+        for artwork in artworks
+    }
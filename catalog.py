@@ -0,0 +1,135 @@
+"""Indexed search and filtering over the artwork catalog.
+
+``CatalogIndex`` is built once per catalog version. Style and artist go into
+inverted indexes, price/width/height into sorted arrays searched with bisect,
+and title words into a sorted token list that supports prefix matches. A
+query estimates how many artworks each filter admits (dictionary lookups and
+binary searches), enumerates only the most selective one and checks the
+remaining filters per candidate, so its cost follows the size of the
+smallest match set rather than the size of the catalog.
+"""
+import re
+from bisect import bisect_left, bisect_right
+
+RANGE_FIELDS = ("price", "width", "height")
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Lower-case word tokens of a title or search string"""
+    return _TOKEN_RE.findall(str(text).lower())
+
+
+class CatalogIndex:
+    """Precomputed indexes over a list of artwork dicts"""
+
+    def __init__(self, artworks):
+        self.artworks = list(artworks)
+        self.by_id = {artwork["id"]: artwork for artwork in self.artworks}
+
+        self.by_style = {}
+        self.by_artist = {}
+        for position, artwork in enumerate(self.artworks):
+            self.by_style.setdefault(artwork.get("style"), []).append(position)
+            self.by_artist.setdefault(artwork.get("artist"), []).append(position)
+
+        # field -> (sorted values, positions in the same order)
+        self.sorted_fields = {}
+        for field in RANGE_FIELDS:
+            order = sorted(range(len(self.artworks)), key=lambda p: self.artworks[p].get(field, 0))
+            self.sorted_fields[field] = ([self.artworks[p].get(field, 0) for p in order], order)
+
+        postings = {}
+        for position, artwork in enumerate(self.artworks):
+            for token in set(tokenize(artwork.get("title", ""))):
+                postings.setdefault(token, []).append(position)
+        self.tokens = sorted(postings)
+        self.postings = [postings[token] for token in self.tokens]
+
+    @property
+    def styles(self):
+        return sorted(style for style in self.by_style if style is not None)
+
+    @property
+    def artists(self):
+        return sorted(artist for artist in self.by_artist if artist is not None)
+
+    def bounds(self, field):
+        """(min, max) of a range field, or (0, 0) for an empty catalog"""
+        values, _ = self.sorted_fields[field]
+        return (values[0], values[-1]) if values else (0, 0)
+
+    def _range_bounds(self, field, low, high):
+        """(start, stop) of the matching slice of a field's sorted order"""
+        values, _ = self.sorted_fields[field]
+        start = 0 if low is None else bisect_left(values, low)
+        stop = len(values) if high is None else bisect_right(values, high)
+        return start, max(start, stop)
+
+    def _prefix_matches(self, prefix):
+        """Positions whose title has a word starting with prefix"""
+        start = bisect_left(self.tokens, prefix)
+        stop = bisect_left(self.tokens, prefix + "\uffff")
+        if stop - start == 1:
+            return set(self.postings[start])
+        matches = set()
+        for posting in self.postings[start:stop]:
+            matches.update(posting)
+        return matches
+
+    def query(self, styles=None, artists=None, text=None, **ranges):
+        """Artworks matching every given filter, in catalog order
+
+        ``styles`` and ``artists`` are collections of accepted values, ``text``
+        matches title words by prefix, and ``price``/``width``/``height`` take
+        ``(low, high)`` tuples where either end may be None.
+        """
+        unknown = set(ranges) - set(RANGE_FIELDS)
+        if unknown:
+            raise TypeError(f"Unknown filter(s): {', '.join(sorted(unknown))}")
+
+        # Each candidate source is (size, iterables of positions); sizes are
+        # known up front and only the smallest source is ever enumerated
+        sources = []
+        predicates = []
+
+        if styles:
+            lists = [self.by_style.get(style, []) for style in styles]
+            sources.append((sum(map(len, lists)), lists))
+            accepted_styles = set(styles)
+            predicates.append(lambda artwork: artwork.get("style") in accepted_styles)
+        if artists:
+            lists = [self.by_artist.get(artist, []) for artist in artists]
+            sources.append((sum(map(len, lists)), lists))
+            accepted_artists = set(artists)
+            predicates.append(lambda artwork: artwork.get("artist") in accepted_artists)
+        for field, (low, high) in ranges.items():
+            if low is None and high is None:
+                continue
+            start, stop = self._range_bounds(field, low, high)
+            order = self.sorted_fields[field][1]
+            sources.append((stop - start, [map(order.__getitem__, range(start, stop))]))
+            predicates.append(lambda artwork, field=field, low=low, high=high: (
+                (low is None or artwork.get(field, 0) >= low) and (high is None or artwork.get(field, 0) <= high)
+            ))
+
+        text_sets = [self._prefix_matches(token) for token in tokenize(text)] if text else []
+        if text_sets:
+            text_matches = set.intersection(*text_sets)
+            sources.append((len(text_matches), [text_matches]))
+
+        if not sources:
+            return list(self.artworks)
+
+        _, driver = min(sources, key=lambda source: source[0])
+        candidates = set()
+        for positions in driver:
+            candidates.update(positions)
+        if text_sets:
+            candidates &= text_matches
+        return [
+            self.artworks[position]
+            for position in sorted(candidates)
+            if all(predicate(self.artworks[position]) for predicate in predicates)
+        ]
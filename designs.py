@@ -0,0 +1,224 @@
+"""Compact saved-design records.
+
+A saved design stores where each artwork hangs, not a copy of the artwork:
+
+    {"id": ..., "name": ..., "created_date": ..., "total_cost": ...,
+     "placements": [[artwork_id, wall_x, wall_y], ...], "wall": [width, height]}
+
+Records are resolved against the current catalog when loaded, so catalog
+edits (prices, titles, images) show up in every design without rewriting it.
+``total_cost`` keeps the price at save time, and ``wall`` the canvas size of
+a wall other than the default one. Legacy records that embed full
+artwork dicts under ``"artworks"`` are still read. Convert them in place with
+
+    python designs.py compact [storage-url]
+
+``DesignIndex`` looks designs up by id and pages through them sorted by
+date, name or cost, optionally narrowed by a search on name words.
+"""
+import sys
+import uuid
+from bisect import bisect_left, insort
+from datetime import datetime
+
+from catalog import tokenize
+from layout import WALL_HEIGHT, WALL_WIDTH
+
+SORT_FIELDS = ("created_date", "name", "total_cost")
+PAGE_SIZE = 20
+
+
+def placements_of(artworks):
+    """[[id, x, y], ...] for a list of placed artwork dicts"""
+    return [[artwork["id"], artwork.get("wall_x", 0), artwork.get("wall_y", 0)] for artwork in artworks]
+
+
+def make_design(name, artworks, wall=(WALL_WIDTH, WALL_HEIGHT)):
+    """New compact design record for the artworks placed on a (width, height) wall"""
+    design = {
+        "id": str(uuid.uuid4()),
+        "name": name,
+        "created_date": datetime.now().isoformat(),
+        "placements": placements_of(artworks),
+        "total_cost": sum(artwork["price"] for artwork in artworks),
+    }
+    if tuple(wall) != (WALL_WIDTH, WALL_HEIGHT):
+        design["wall"] = list(wall)
+    return design
+
+
+def design_wall(design):
+    """(width, height) of the wall a design was made for"""
+    width, height = design.get("wall") or (WALL_WIDTH, WALL_HEIGHT)
+    return width, height
+
+
+def design_placements(design):
+    """Placements of a compact or legacy design record"""
+    if "placements" in design:
+        return design["placements"]
+    return placements_of(design.get("artworks", []))
+
+
+def resolve_design(design, catalog_by_id):
+    """Placed artwork dicts of a design, built from the current catalog
+
+    Returns (artworks, missing ids). A legacy record falls back to its
+    embedded copy of an artwork that has left the catalog.
+    """
+    embedded = {artwork["id"]: artwork for artwork in design.get("artworks", ())}
+    artworks, missing = [], []
+    for key, x, y in design_placements(design):
+        artwork = catalog_by_id.get(key) or embedded.get(key)
+        if artwork is None:
+            missing.append(key)
+            continue
+        artworks.append(dict(artwork, wall_x=x, wall_y=y))
+    return artworks, missing
+
+
+def compact_design(design, catalog_by_id):
+    """Compact form of a legacy record, or None when some of its artworks left the catalog"""
+    if "placements" in design:
+        return design
+    placements = placements_of(design.get("artworks", []))
+    if any(key not in catalog_by_id for key, _, _ in placements):
+        # Converting would lose the only remaining copy of those artworks
+        return None
+    compact = {key: value for key, value in design.items() if key != "artworks"}
+    compact["placements"] = placements
+    return compact
+
+
+def compact_storage(storage):
+    """Rewrite legacy design records in compact form; returns (converted, kept as legacy)"""
+    data = storage.load()
+    catalog_by_id = {artwork["id"]: artwork for artwork in data.get("artworks", [])}
+    converted = kept = 0
+    designs = []
+    for design in data.get("gallery_designs", []):
+        compact = compact_design(design, catalog_by_id)
+        if compact is None:
+            kept += 1
+            designs.append(design)
+        else:
+            converted += compact is not design
+            designs.append(compact)
+    if converted:
+        data["gallery_designs"] = designs
+        storage.save(data)
+    return converted, kept
+
+
+def design_label(design):
+    """Short description of a design for pickers"""
+    return f"{design.get('name', '')} (${design.get('total_cost', 0)} - {len(design_placements(design))} pieces)"
+
+
+SORT_KEYS = {
+    "created_date": lambda design: design.get("created_date", ""),
+    "name": lambda design: design.get("name", "").casefold(),
+    "total_cost": lambda design: design.get("total_cost", 0),
+}
+
+
+class DesignIndex:
+    """Id lookup, name search and sorted paging over saved design records
+
+    Each sort field keeps (key, position) pairs of all designs in sorted
+    order. An unfiltered page is a slice of that order. A search enumerates
+    only its matches and sorts them by key, so neither costs more than the
+    result it returns. ``add`` inserts new designs in place, so a growing
+    design history never needs a rebuild.
+    """
+
+    def __init__(self, designs=()):
+        self.designs = []
+        self.by_id = {}
+        self.keys = {field: [] for field in SORT_KEYS}
+        self.orders = {field: [] for field in SORT_KEYS}
+        self.tokens = []
+        self.postings = []
+        self._append(designs)
+        for order in self.orders.values():
+            order.sort()
+
+        postings = {}
+        for position, design in enumerate(self.designs):
+            for token in set(tokenize(design.get("name", ""))):
+                postings.setdefault(token, []).append(position)
+        self.tokens = sorted(postings)
+        self.postings = [postings[token] for token in self.tokens]
+
+    def __len__(self):
+        return len(self.designs)
+
+    def _append(self, designs, sort=False):
+        """Append new designs to the records; their order entries are inserted sorted or appended to sort later"""
+        added = []
+        for design in designs:
+            if design["id"] in self.by_id:
+                continue
+            position = len(self.designs)
+            self.designs.append(design)
+            self.by_id[design["id"]] = design
+            for field, key in SORT_KEYS.items():
+                self.keys[field].append(key(design))
+                entry = (self.keys[field][position], position)
+                if sort:
+                    insort(self.orders[field], entry)
+                else:
+                    self.orders[field].append(entry)
+            added.append(position)
+        return added
+
+    def add(self, design):
+        """Insert one new design; a design whose id is already indexed is ignored"""
+        if not self._append([design], sort=True):
+            return
+        position = len(self.designs) - 1
+        for token in set(tokenize(design.get("name", ""))):
+            i = bisect_left(self.tokens, token)
+            if i < len(self.tokens) and self.tokens[i] == token:
+                self.postings[i].append(position)
+            else:
+                self.tokens.insert(i, token)
+                self.postings.insert(i, [position])
+
+    def _prefix_matches(self, prefix):
+        """Positions whose name has a word starting with prefix"""
+        start = bisect_left(self.tokens, prefix)
+        stop = bisect_left(self.tokens, prefix + "\uffff")
+        matches = set()
+        for posting in self.postings[start:stop]:
+            matches.update(posting)
+        return matches
+
+    def page(self, text=None, sort="created_date", descending=True, page=0, page_size=PAGE_SIZE):
+        """One page of designs, as (designs, number of designs matching)
+
+        ``text`` matches name words by prefix; ``sort`` is one of
+        ``SORT_FIELDS`` and ``page`` counts from 0.
+        """
+        order = self.orders[sort]
+        tokens = tokenize(text) if text else []
+        if tokens:
+            keys = self.keys[sort]
+            matches = set.intersection(*(self._prefix_matches(token) for token in tokens))
+            order = sorted((keys[position], position) for position in matches)
+        total = len(order)
+        start = page * page_size
+        if descending:
+            entries = order[max(0, total - start - page_size):max(0, total - start)][::-1]
+        else:
+            entries = order[start:start + page_size]
+        return [self.designs[position] for _, position in entries], total
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3) or sys.argv[1] != "compact":
+        sys.exit("usage: python designs.py compact [storage-url]")
+    from storage import get_storage
+
+    converted, kept = compact_storage(get_storage(sys.argv[2] if len(sys.argv) == 3 else None))
+    print(f"Compacted {converted} designs; {kept} kept in legacy form (artworks missing from the catalog)")
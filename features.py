@@ -0,0 +1,226 @@
+"""Colour features of the catalog images and "goes well with your wall" recommendations.
+
+    python features.py [storage-url] [--workers N]
+
+Each image is shrunk to at most ``SAMPLE_SIZE`` px a side and described by:
+
+- a colour histogram over ``LEVELS`` levels per RGB channel (64 bins), as
+  shares of the image's pixels
+- a palette: the mean colours of its ``PALETTE_SIZE`` most populated bins,
+  with their shares
+
+Histograms and palettes for a whole chunk of images come from one
+``np.bincount`` over all of their pixels. Features are stored in
+``FEATURES_PATH`` as a compact ``.npz`` keyed by image SHA-256, from the asset
+manifest, so an update only computes new or changed images and drops
+images the catalog no longer uses.
+
+``ColourIndex`` holds the square roots of the histograms. These are unit
+vectors, so their dot product is the Bhattacharyya coefficient, i.e. cosine
+similarity. A wall's profile is the area-weighted mix of its pieces, and the
+recommendations are the nearest artworks to it: one matrix-vector product
+over the catalog.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from layout import piece_size
+
+FEATURES_PATH = os.environ.get("GALLERY_FEATURES", "artwork_features.npz")
+FEATURE_VERSION = 1  # bump when the feature definition changes, to recompute everything
+SAMPLE_SIZE = 64
+LEVELS = 4
+BINS = LEVELS ** 3
+PALETTE_SIZE = 5
+CHUNK_SIZE = 32
+
+
+def _pixels(path):
+    """RGB pixels of an image shrunk to SAMPLE_SIZE, as an (n, 3) uint8 array; None if unreadable"""
+    from PIL import Image
+
+    try:
+        with Image.open(path) as img:
+            img.draft("RGB", (SAMPLE_SIZE, SAMPLE_SIZE))  # decodes JPEGs at a reduced scale
+            img = img.convert("RGB")
+            img.thumbnail((SAMPLE_SIZE, SAMPLE_SIZE))
+            return np.asarray(img, dtype=np.uint8).reshape(-1, 3)
+    except OSError:
+        return None
+
+
+def compute_features(paths):
+    """Histograms (n, BINS), palettes (n, PALETTE_SIZE, 3) and palette shares for images
+
+    Unreadable images get all-zero rows.
+    """
+    pixels = [_pixels(path) for path in paths]
+    pixels = [p if p is not None and len(p) else np.zeros((0, 3), np.uint8) for p in pixels]
+    owner = np.repeat(np.arange(len(paths)), [len(p) for p in pixels])
+    stacked = np.concatenate(pixels) if pixels else np.zeros((0, 3), np.uint8)
+    levels = (stacked // (256 // LEVELS)).astype(np.intp)
+    bins = owner * BINS + (levels[:, 0] * LEVELS + levels[:, 1]) * LEVELS + levels[:, 2]
+
+    size = len(paths) * BINS
+    counts = np.bincount(bins, minlength=size).reshape(len(paths), BINS)
+    sums = np.stack([np.bincount(bins, weights=stacked[:, c], minlength=size) for c in range(3)], axis=-1)
+    sums = sums.reshape(len(paths), BINS, 3)
+
+    totals = np.maximum(counts.sum(axis=1, keepdims=True), 1)
+    histograms = (counts / totals).astype(np.float32)
+    top = np.argsort(-counts, axis=1, kind="stable")[:, :PALETTE_SIZE]
+    top_counts = np.take_along_axis(counts, top, axis=1)
+    top_sums = np.take_along_axis(sums, top[..., None], axis=1)
+    palettes = np.rint(top_sums / np.maximum(top_counts, 1)[..., None]).astype(np.uint8)
+    shares = np.take_along_axis(histograms, top, axis=1)
+    return histograms, palettes, shares
+
+
+class FeatureStore:
+    """Colour features by image digest"""
+
+    def __init__(self, digests=(), histograms=None, palettes=None, shares=None):
+        self.digests = list(digests)
+        self.row = {digest: i for i, digest in enumerate(self.digests)}
+        self.histograms = histograms if histograms is not None else np.zeros((0, BINS), np.float32)
+        self.palettes = palettes if palettes is not None else np.zeros((0, PALETTE_SIZE, 3), np.uint8)
+        self.shares = shares if shares is not None else np.zeros((0, PALETTE_SIZE), np.float32)
+
+    def __len__(self):
+        return len(self.digests)
+
+    def save(self, path=FEATURES_PATH):
+        # np.savez appends .npz to names without it, so write through a file object
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, version=FEATURE_VERSION, digests=np.array(self.digests, dtype="U64"),
+                                histograms=self.histograms, palettes=self.palettes, shares=self.shares)
+        os.replace(tmp_path, path)
+
+
+def load_features(path=FEATURES_PATH):
+    """The stored features, or an empty store when there are none or they are outdated"""
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["version"]) != FEATURE_VERSION:
+                return FeatureStore()
+            return FeatureStore(data["digests"].tolist(), data["histograms"], data["palettes"], data["shares"])
+    except (OSError, ValueError, KeyError):
+        return FeatureStore()
+
+
+def update_features(manifest, path=FEATURES_PATH, workers=None, max_new=None):
+    """Bring the stored features in line with the manifest's images and return them
+
+    Only images whose digest has no features yet are computed, in a process
+    pool when there are several chunks of them and workers is not 1. The pool
+    uses the spawn start method, so it is safe to start from a multi-threaded
+    server. With max_new set and more new images than that, nothing is
+    computed: the caller gets the stored features for the images that have
+    them.
+    """
+    store = load_features(path)
+    wanted = {entry.sha256: entry.resolved for entry in manifest.entries.values()}
+    new = sorted(digest for digest in wanted if digest not in store.row)
+    if max_new is not None and len(new) > max_new:
+        new = []
+    if not new and set(store.digests) <= wanted.keys():
+        return store
+
+    chunks = [new[i:i + CHUNK_SIZE] for i in range(0, len(new), CHUNK_SIZE)]
+    chunk_paths = [[wanted[digest] for digest in chunk] for chunk in chunks]
+    if len(chunks) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = list(pool.map(compute_features, chunk_paths))
+    else:
+        results = [compute_features(paths) for paths in chunk_paths]
+
+    # Keep features the catalog still uses, then append the new ones
+    kept = [i for i, digest in enumerate(store.digests) if digest in wanted]
+    updated = FeatureStore(
+        [store.digests[i] for i in kept] + new,
+        np.concatenate([store.histograms[kept]] + [r[0] for r in results]),
+        np.concatenate([store.palettes[kept]] + [r[1] for r in results]),
+        np.concatenate([store.shares[kept]] + [r[2] for r in results]),
+    )
+    updated.save(path)
+    return updated
+
+
+class ColourIndex:
+    """Nearest-neighbour search over the colour histograms of the catalog"""
+
+    def __init__(self, artworks, manifest, store):
+        self.artworks = []
+        rows = []
+        for artwork in artworks:
+            entry = manifest.get(artwork.get("image_path"))
+            row = store.row.get(entry.sha256) if entry else None
+            if row is not None and store.histograms[row].any():
+                self.artworks.append(artwork)
+                rows.append(row)
+        self.position = {artwork["id"]: i for i, artwork in enumerate(self.artworks)}
+        self.vectors = np.sqrt(store.histograms[rows]) if rows else np.zeros((0, BINS), np.float32)
+        self.palettes = store.palettes[rows] if rows else np.zeros((0, PALETTE_SIZE, 3), np.uint8)
+
+    def __len__(self):
+        return len(self.artworks)
+
+    def palette(self, artwork):
+        """(PALETTE_SIZE, 3) dominant colours of an artwork, or None without features"""
+        position = self.position.get(artwork["id"])
+        return None if position is None else self.palettes[position]
+
+    def recommend(self, wall, k=5, allowed=None):
+        """Up to k (artwork, similarity) pairs matching the colours of the wall's pieces, best first
+
+        allowed optionally restricts the results to a set of artwork ids.
+        """
+        placed = [(self.position[artwork["id"]], artwork) for artwork in wall if artwork["id"] in self.position]
+        if not placed:
+            return []
+        weights = np.array([np.prod(piece_size(artwork)) for _, artwork in placed], np.float32)
+        profile = weights @ self.vectors[[position for position, _ in placed]]
+        profile /= np.linalg.norm(profile) or 1
+        scores = self.vectors @ profile
+        scores[[position for position, _ in placed]] = -np.inf
+        if allowed is not None:
+            mask = np.fromiter((artwork["id"] in allowed for artwork in self.artworks), bool, len(self.artworks))
+            scores[~mask] = -np.inf
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.artworks[i], float(scores[i])) for i in top]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python features.py", description="Compute colour features for the catalog")
+    parser.add_argument("storage", nargs="?", help="storage URL (default: GALLERY_STORAGE or artwork_database.json)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    from manifest import build_manifest
+    from storage import get_storage
+
+    started = time.time()
+    artworks = get_storage(args.storage).load_artworks()
+    manifest = build_manifest(artwork["image_path"] for artwork in artworks)
+    before = set(load_features().digests)
+    store = update_features(manifest, workers=args.workers)
+    computed = len(set(store.digests) - before)
+    print(f"{len(store)} images with colour features ({computed} computed) in {time.time() - started:.1f}s "
+          f"-> {FEATURES_PATH}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
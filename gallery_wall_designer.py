@@ -1,40 +1,110 @@
+import sys
+
+if __name__ == "__main__" and sys.argv[1:2] == ["batch"]:
+    # Headless: python -m gallery_wall_designer batch ..., without importing Streamlit
+    from batch import main as batch_main
+    sys.exit(batch_main(sys.argv[2:]))
+if __name__ == "__main__" and sys.argv[1:2] == ["build"]:
+    from startup import main as build_main
+    sys.exit(build_main(sys.argv[2:]))
+
 import streamlit as st
 import json
 import math
-import uuid
-from datetime import datetime
+import hashlib
 import streamlit.components.v1 as components
-import base64
 import os
+import threading
+import metrics
+from assets import ASSET_DIR, ASSET_URL, asset_url, publish_asset, publish_catalog_state, start_asset_server
+from catalog import CatalogIndex
+from designs import design_label, design_wall, make_design, resolve_design
+from history import History
+from manifest import build_manifest
+from layout import SCALE, STRATEGIES as LAYOUT_STRATEGIES, WALL_HEIGHT, WALL_WIDTH, arrange, couch_rect
+from spatial import describe_problems, find_free_spot, snap_layout, validate_layout
+from startup import snapshot_asset, snapshot_catalog_state
+from storage import get_storage
+from thumbnails import VARIANTS, WALL_VARIANTS, get_thumbnail
+from wall_state import apply_patch, wall_version
 
-st.set_page_config(
-    page_title="Gallery Wall Designer",
-    page_icon="🖼️",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
+BUDGET_ALTERNATIVES = 3
+# Wall edits within this window are posted to Python as one batch
+WALL_BATCH_MS = int(os.environ.get("GALLERY_BATCH_MS", 400))
+OPTIMIZE_BUDGET_MS = int(os.environ.get("GALLERY_OPTIMIZE_BUDGET_MS", 500))
+RECOMMENDATIONS = 4
+# Up to this many new catalog images get colour features while the app starts;
+# a larger backlog waits for `python features.py` or the build step
+FEATURES_INLINE_LIMIT = int(os.environ.get("GALLERY_FEATURES_INLINE_LIMIT", 200))
 
-@st.cache_data
-def load_database():
-    with open('artwork_database.json', 'r') as f:
-        return json.load(f)
+def get_catalog_token():
+    """Catalog version token; a stat or a single-row query, cheap enough for every rerun"""
+    return get_storage().catalog_version()
+
+@metrics.counted("load_catalog")
+@st.cache_resource(max_entries=2)
+def load_catalog(token):
+    """Load the artwork catalog once per catalog token
+
+    The result is shared by every session, so treat it as read-only.
+    """
+    metrics.cache_miss()
+    return get_storage().load_artworks()
 
-def save_database(data):
-    with open('artwork_database.json', 'w') as f:
-        json.dump(data, f, indent=2)
+@st.cache_resource(max_entries=2)
+def get_catalog_version(token):
+    """Content hash of the artwork catalog, used to key cached component state
 
+    Keyed on the catalog token only, so saving a design neither reloads the
+    catalog nor rehashes it.
+    """
+    return get_state_hash(load_catalog(token))
+
+@st.cache_resource
+def start_metrics_export():
+    """Serve or write Prometheus metrics when GALLERY_METRICS_PORT / GALLERY_METRICS_FILE are set"""
+    metrics.start_export(os.environ.get("GALLERY_METRICS_PORT"), os.environ.get("GALLERY_METRICS_FILE"))
+
+@st.cache_resource
+def get_asset_base_url():
+    """Start the local asset server when one is configured and return the asset base URL"""
+    port = os.environ.get("GALLERY_ASSET_PORT")
+    if port:
+        return os.environ.get("GALLERY_ASSET_URL") or start_asset_server(int(port))
+    return ASSET_URL
+
+@metrics.counted("image_url")
 @st.cache_data
-def get_image_base64(image_path):
-    """Convert image to base64 string"""
+def get_image_url(image_path):
+    """Publish an image as a content-addressed asset and return its URL"""
+    metrics.cache_miss()
+    name = snapshot_asset(image_path)
+    if name:
+        return asset_url(name, get_asset_base_url())
     if os.path.exists(image_path):
-        with open(image_path, "rb") as img_file:
-            return base64.b64encode(img_file.read()).decode()
+        return asset_url(publish_asset(image_path), get_asset_base_url())
     return None
 
+@metrics.counted("thumbnail_url")
+@st.cache_data
+def get_thumbnail_url(image_path, variant, _manifest):
+    """Get the asset URL of a pre-generated thumbnail variant of a catalog image"""
+    metrics.cache_miss()
+    asset = _manifest.get(image_path)
+    if asset is None:
+        return None
+    name = snapshot_asset(image_path, variant, asset)
+    if name:
+        return asset_url(name, get_asset_base_url())
+    thumbnail = get_thumbnail(asset.resolved, variant, asset.sha256)
+    if thumbnail is None:
+        return None
+    return get_image_url(thumbnail[0])
+
 @st.cache_data  
-def get_couch_base64():
-    """Get couch image as base64"""
-    return get_image_base64("couch.webp")
+def get_couch_url():
+    """Get couch image URL"""
+    return get_image_url("couch.webp")
 
 def get_artwork_pattern(style):
     """Generate CSS pattern based on artwork style"""
@@ -50,619 +120,500 @@ def get_artwork_pattern(style):
     }
     return patterns.get(style, "")
 
-def get_drag_drop_html(artworks, selected_artworks):
-    """Generate HTML/CSS/JS for drag and drop functionality"""
-    
-    # Get couch image
-    couch_base64 = get_couch_base64()
-    
-    # Create artwork thumbnails HTML with real images
-    artwork_html = ""
+COMPONENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "wall_component")
+
+# Bidirectional component: the page is served once and kept mounted across
+# reruns; state arrives as render args and interactions come back as patches
+wall_component = components.declare_component("gallery_wall", path=COMPONENT_DIR)
+
+def get_state_hash(data):
+    """Stable short hash of JSON-serializable state"""
+    return hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()[:16]
+
+def get_image_urls(artworks, manifest):
+    """Palette and wall thumbnail URLs keyed by image path, for artworks whose image exists"""
+    images = {}
     for artwork in artworks:
-        image_base64 = get_image_base64(artwork['image_path'])
-        if image_base64:
-            artwork_html += f"""
-            <div class="artwork-item" data-id="{artwork['id']}" draggable="true">
-                <div class="artwork-visual" style="
-                    border: {artwork['frame_width'] * 2}px solid #8B4513;
-                    border-radius: 4px;
-                    width: 120px;
-                    height: 90px;
-                    position: relative;
-                    box-shadow: 0 4px 8px rgba(0,0,0,0.3);
-                    overflow: hidden;
-                ">
-                    <img src="data:image/png;base64,{image_base64}" 
-                         style="width: 100%; height: 100%; object-fit: cover;" 
-                         alt="{artwork['title']}">
-                    <div class="artwork-overlay">
-                        <div class="artwork-title">{artwork['title']}</div>
-                        <div class="artwork-info">{artwork['width']}" × {artwork['height']}"</div>
-                        <div class="artwork-price">${artwork['price']}</div>
-                    </div>
-                </div>
-            </div>
-            """
-    
-    # Create wall artworks HTML
-    wall_artworks_html = ""
-    for artwork in selected_artworks:
-        x = artwork.get('wall_x', 0)
-        y = artwork.get('wall_y', 0)
-        width = artwork['width'] * 4
-        height = artwork['height'] * 4
-        image_base64 = get_image_base64(artwork['image_path'])
-        
-        if image_base64:
-            wall_artworks_html += f"""
-            <div class="wall-artwork" data-id="{artwork['id']}" draggable="true"
-                 style="left: {x}px; top: {y}px; width: {width}px; height: {height}px;">
-                <div class="wall-artwork-visual" style="
-                    border: {artwork['frame_width'] * 3}px solid #654321;
-                    width: 100%;
-                    height: 100%;
-                    border-radius: 3px;
-                    box-shadow: 0 6px 12px rgba(0,0,0,0.4);
-                    overflow: hidden;
-                    position: relative;
-                ">
-                    <img src="data:image/png;base64,{image_base64}" 
-                         style="width: 100%; height: 100%; object-fit: cover;" 
-                         alt="{artwork['title']}">
-                    <div class="wall-artwork-title">{artwork['title']}</div>
-                </div>
-            </div>
-            """
-    
-    html_content = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <style>
-            * {{
-                box-sizing: border-box;
-                margin: 0;
-                padding: 0;
-            }}
-            
-            body {{
-                font-family: 'Arial', sans-serif;
-                background: #f0f0f0;
-            }}
-            
-            .gallery-container {{
-                display: flex;
-                gap: 20px;
-                padding: 20px;
-                min-height: 600px;
-            }}
-            
-            .artwork-palette {{
-                width: 280px;
-                background: linear-gradient(135deg, #2c3e50 0%, #34495e 100%);
-                border-radius: 15px;
-                padding: 20px;
-                box-shadow: 0 10px 25px rgba(0,0,0,0.2);
-                max-height: 600px;
-                overflow-y: auto;
-            }}
-            
-            .palette-header {{
-                color: #ecf0f1;
-                font-size: 18px;
-                font-weight: bold;
-                text-align: center;
-                margin-bottom: 20px;
-                padding-bottom: 15px;
-                border-bottom: 2px solid #3498db;
-            }}
-            
-            .artwork-item {{
-                margin: 15px auto;
-                cursor: grab;
-                transition: all 0.3s ease;
-                user-select: none;
-                display: flex;
-                justify-content: center;
-            }}
-            
-            .artwork-item:hover {{
-                transform: translateY(-5px) scale(1.05);
-            }}
-            
-            .artwork-item:active {{
-                cursor: grabbing;
-                transform: rotate(2deg) scale(1.1);
-            }}
-            
-            .artwork-overlay {{
-                position: absolute;
-                bottom: 0;
-                left: 0;
-                right: 0;
-                background: linear-gradient(transparent, rgba(0,0,0,0.8));
-                color: white;
-                padding: 8px;
-                border-radius: 0 0 4px 4px;
-            }}
-            
-            .artwork-title {{
-                font-size: 14px;
-                font-weight: bold;
-                line-height: 1.2;
-                margin-bottom: 2px;
-                text-shadow: 1px 1px 2px rgba(0,0,0,0.8);
-            }}
-            
-            .artwork-info {{
-                font-size: 11px;
-                opacity: 0.9;
-                text-shadow: 1px 1px 2px rgba(0,0,0,0.8);
-            }}
-            
-            .artwork-price {{
-                font-size: 13px;
-                font-weight: bold;
-                color: #f1c40f;
-                text-shadow: 1px 1px 2px rgba(0,0,0,0.8);
-            }}
-            
-            .wall-section {{
-                flex: 1;
-                display: flex;
-                flex-direction: column;
-            }}
-            
-            .wall-header {{
-                text-align: center;
-                margin-bottom: 20px;
-                color: #2c3e50;
-            }}
-            
-            .wall-header h2 {{
-                font-size: 24px;
-                margin-bottom: 8px;
-            }}
-            
-            .wall-header p {{
-                color: #7f8c8d;
-                font-size: 16px;
-            }}
-            
-            .wall-canvas {{
-                flex: 1;
-                min-height: 500px;
-                position: relative;
-                background: linear-gradient(135deg, #bdc3c7 0%, #2c3e50 100%);
-                border-radius: 15px;
-                box-shadow: inset 0 0 50px rgba(0,0,0,0.3);
-                overflow: hidden;
-            }}
-            
-            .wall-canvas::before {{
-                content: '';
-                position: absolute;
-                top: 0;
-                left: 0;
-                right: 0;
-                bottom: 0;
-                background-image: 
-                    /* Wall texture */
-                    repeating-linear-gradient(90deg, transparent, transparent 3px, rgba(255,255,255,0.03) 3px, rgba(255,255,255,0.03) 6px),
-                    repeating-linear-gradient(0deg, transparent, transparent 3px, rgba(0,0,0,0.02) 3px, rgba(0,0,0,0.02) 6px);
-                pointer-events: none;
-            }}
-            
-            .room-elements {{
-                position: absolute;
-                bottom: 0;
-                left: 0;
-                right: 0;
-                height: 120px;
-                background: linear-gradient(180deg, transparent 0%, rgba(0,0,0,0.1) 50%, #8b4513 100%);
-                pointer-events: none;
-            }}
-            
-            .couch {{
-                position: absolute;
-                bottom: 10px;
-                left: 50%;
-                transform: translateX(-50%);
-                width: 300px;
-                height: 120px;
-                pointer-events: none;
-                z-index: 2;
-            }}
-            
-            .couch img {{
-                width: 100%;
-                height: 100%;
-                object-fit: contain;
-                filter: drop-shadow(0 5px 15px rgba(0,0,0,0.4));
-            }}
-            
-            .wall-canvas.drag-over {{
-                box-shadow: 
-                    inset 0 0 50px rgba(0,0,0,0.3),
-                    0 0 20px rgba(52, 152, 219, 0.5);
-                background: linear-gradient(135deg, #3498db 0%, #2980b9 100%);
-            }}
-            
-            .wall-artwork {{
-                position: absolute;
-                cursor: move;
-                transition: transform 0.2s ease;
-                z-index: 1;
-            }}
-            
-            .wall-artwork:hover {{
-                transform: scale(1.02);
-                z-index: 10;
-            }}
-            
-            .wall-artwork-visual {{
-                position: relative;
-                display: flex;
-                align-items: center;
-                justify-content: center;
-            }}
-            
-            .wall-artwork-title {{
-                position: absolute;
-                bottom: 5px;
-                left: 5px;
-                right: 5px;
-                background: rgba(0,0,0,0.7);
-                color: white;
-                font-size: 12px;
-                font-weight: bold;
-                text-align: center;
-                padding: 4px;
-                border-radius: 3px;
-                text-shadow: none;
-            }}
-            
-            .stats {{
-                position: absolute;
-                top: 20px;
-                right: 20px;
-                background: rgba(255,255,255,0.95);
-                padding: 15px;
-                border-radius: 10px;
-                box-shadow: 0 5px 15px rgba(0,0,0,0.2);
-                min-width: 120px;
-                z-index: 5;
-            }}
-            
-            .stat-item {{
-                display: flex;
-                justify-content: space-between;
-                margin-bottom: 8px;
-                font-size: 14px;
-            }}
-            
-            .stat-item:last-child {{
-                margin-bottom: 0;
-                font-weight: bold;
-                border-top: 1px solid #ddd;
-                padding-top: 8px;
-                color: #27ae60;
-            }}
-            
-            .drop-zone-hint {{
-                position: absolute;
-                top: 50%;
-                left: 50%;
-                transform: translate(-50%, -50%);
-                color: rgba(255,255,255,0.8);
-                font-size: 24px;
-                text-align: center;
-                pointer-events: none;
-                text-shadow: 2px 2px 4px rgba(0,0,0,0.5);
-                z-index: 1;
-            }}
-            
-            .drop-zone-hint .icon {{
-                font-size: 48px;
-                display: block;
-                margin-bottom: 15px;
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="gallery-container">
-            <div class="artwork-palette">
-                <div class="palette-header">🎨 Artwork Collection</div>
-                {artwork_html}
-            </div>
-            
-            <div class="wall-section">
-                <div class="wall-header">
-                    <h2>🖼️ Your Gallery Wall</h2>
-                    <p>Drag artworks from the palette to design your wall</p>
-                </div>
-                
-                <div class="wall-canvas" id="wall-canvas" ondrop="drop(event)" ondragover="allowDrop(event)">
-                    <div class="room-elements">
-                        <div class="couch">
-                            {"<img src='data:image/webp;base64," + couch_base64 + "' alt='Couch'>" if couch_base64 else ""}
-                        </div>
-                    </div>
-                    
-                    <div class="stats">
-                        <div class="stat-item">
-                            <span>Pieces:</span> <span id="piece-count">{len(selected_artworks)}</span>
-                        </div>
-                        <div class="stat-item">
-                            <span>Total:</span> <span id="total-cost">${sum(art['price'] for art in selected_artworks)}</span>
-                        </div>
-                    </div>
-                    
-                    {wall_artworks_html}
-                    
-                    {'' if selected_artworks else '<div class="drop-zone-hint"><span class="icon">🎨</span>Drag & Drop Artworks Here!</div>'}
-                </div>
-            </div>
-        </div>
-        
-        <script>
-            let draggedElement = null;
-            let wallArtworks = {json.dumps(selected_artworks)};
-            let artworks = {json.dumps(artworks)};
-            
-            // Create image mapping for JavaScript access
-            const imageMapping = {{
-                {', '.join([f'"{artwork["image_path"]}": "{get_image_base64(artwork["image_path"])}"' for artwork in artworks if get_image_base64(artwork["image_path"])])}
-            }};
-            
-            function getImageBase64(imagePath) {{
-                return imageMapping[imagePath] || '';
-            }}
-            
-            // Add drag event listeners to artwork items
-            document.querySelectorAll('.artwork-item').forEach(item => {{
-                item.addEventListener('dragstart', function(e) {{
-                    draggedElement = this;
-                    this.style.opacity = '0.5';
-                    e.dataTransfer.effectAllowed = 'copy';
-                }});
-                
-                item.addEventListener('dragend', function(e) {{
-                    this.style.opacity = '1';
-                }});
-            }});
-            
-            // Add drag event listeners to wall artworks
-            document.querySelectorAll('.wall-artwork').forEach(item => {{
-                item.addEventListener('dragstart', function(e) {{
-                    draggedElement = this;
-                    this.style.opacity = '0.7';
-                    e.dataTransfer.effectAllowed = 'move';
-                }});
-                
-                item.addEventListener('dragend', function(e) {{
-                    this.style.opacity = '1';
-                }});
-                
-                // Double click to remove
-                item.addEventListener('dblclick', function(e) {{
-                    const artworkId = parseInt(this.dataset.id);
-                    wallArtworks = wallArtworks.filter(art => art.id !== artworkId);
-                    updateStreamlit();
-                    this.remove();
-                    updateStats();
-                    e.preventDefault();
-                }});
-            }});
-            
-            function allowDrop(ev) {{
-                ev.preventDefault();
-                const wall = ev.currentTarget;
-                wall.classList.add('drag-over');
-            }}
-            
-            function drop(ev) {{
-                ev.preventDefault();
-                const wall = ev.currentTarget;
-                wall.classList.remove('drag-over');
-                
-                if (!draggedElement) return;
-                
-                const rect = wall.getBoundingClientRect();
-                const x = Math.max(10, ev.clientX - rect.left - 50);
-                const y = Math.max(10, ev.clientY - rect.top - 50);
-                
-                if (draggedElement.classList.contains('artwork-item')) {{
-                    // Adding new artwork
-                    const artworkId = parseInt(draggedElement.dataset.id);
-                    const artworkData = artworks.find(art => art.id === artworkId);
-                    
-                    if (artworkData && !wallArtworks.find(art => art.id === artworkId)) {{
-                        const newArtwork = {{
-                            ...artworkData,
-                            wall_x: x,
-                            wall_y: y
-                        }};
-                        
-                        wallArtworks.push(newArtwork);
-                        createWallArtwork(newArtwork, x, y);
-                        updateStreamlit();
-                        updateStats();
-                        
-                        // Remove drop zone hint if it exists
-                        const hint = document.querySelector('.drop-zone-hint');
-                        if (hint) hint.style.display = 'none';
-                    }}
-                }} else if (draggedElement.classList.contains('wall-artwork')) {{
-                    // Repositioning existing artwork
-                    const artworkId = parseInt(draggedElement.dataset.id);
-                    const artwork = wallArtworks.find(art => art.id === artworkId);
-                    
-                    if (artwork) {{
-                        artwork.wall_x = x;
-                        artwork.wall_y = y;
-                        
-                        draggedElement.style.left = x + 'px';
-                        draggedElement.style.top = y + 'px';
-                        updateStreamlit();
-                    }}
-                }}
-                
-                draggedElement = null;
-            }}
-            
-            function createWallArtwork(artwork, x, y) {{
-                const wallArtwork = document.createElement('div');
-                wallArtwork.className = 'wall-artwork';
-                wallArtwork.dataset.id = artwork.id;
-                wallArtwork.draggable = true;
-                wallArtwork.style.left = x + 'px';
-                wallArtwork.style.top = y + 'px';
-                wallArtwork.style.width = (artwork.width * 4) + 'px';
-                wallArtwork.style.height = (artwork.height * 4) + 'px';
-                
-                // Get the artwork data with image
-                const artworkWithImage = artworks.find(art => art.id === artwork.id);
-                const imageBase64 = getImageBase64(artworkWithImage.image_path);
-                
-                wallArtwork.innerHTML = `
-                    <div class="wall-artwork-visual" style="
-                        border: ${{artwork.frame_width * 3}}px solid #654321;
-                        width: 100%;
-                        height: 100%;
-                        border-radius: 3px;
-                        box-shadow: 0 6px 12px rgba(0,0,0,0.4);
-                        overflow: hidden;
-                        position: relative;
-                    ">
-                        <img src="data:image/png;base64,${{imageBase64}}" 
-                             style="width: 100%; height: 100%; object-fit: cover;" 
-                             alt="${{artwork.title}}">
-                        <div class="wall-artwork-title">${{artwork.title}}</div>
-                    </div>
-                `;
-                
-                // Add event listeners
-                wallArtwork.addEventListener('dragstart', function(e) {{
-                    draggedElement = this;
-                    this.style.opacity = '0.7';
-                    e.dataTransfer.effectAllowed = 'move';
-                }});
-                
-                wallArtwork.addEventListener('dragend', function(e) {{
-                    this.style.opacity = '1';
-                }});
-                
-                wallArtwork.addEventListener('dblclick', function(e) {{
-                    const artworkId = parseInt(this.dataset.id);
-                    wallArtworks = wallArtworks.filter(art => art.id !== artworkId);
-                    updateStreamlit();
-                    this.remove();
-                    updateStats();
-                    
-                    // Show drop zone hint if no artworks left
-                    if (wallArtworks.length === 0) {{
-                        const hint = document.querySelector('.drop-zone-hint');
-                        if (hint) hint.style.display = 'block';
-                    }}
-                    e.preventDefault();
-                }});
-                
-                document.getElementById('wall-canvas').appendChild(wallArtwork);
-            }}
-            
-            function getArtworkPattern(style) {{
-                const patterns = {{
-                    "Abstract": "radial-gradient(circle at 20% 30%, rgba(255,255,255,0.3) 2px, transparent 2px), radial-gradient(circle at 70% 80%, rgba(0,0,0,0.2) 1px, transparent 1px)",
-                    "Landscape": "linear-gradient(45deg, rgba(255,255,255,0.1) 25%, transparent 25%), linear-gradient(-45deg, rgba(255,255,255,0.1) 25%, transparent 25%)",
-                    "Urban": "linear-gradient(90deg, rgba(0,0,0,0.1) 1px, transparent 1px), linear-gradient(0deg, rgba(0,0,0,0.1) 1px, transparent 1px)",
-                    "Botanical": "radial-gradient(circle at 30% 40%, rgba(255,255,255,0.2) 3px, transparent 3px), radial-gradient(circle at 70% 20%, rgba(255,255,255,0.15) 2px, transparent 2px)",
-                    "Geometric": "linear-gradient(45deg, rgba(255,255,255,0.15) 25%, transparent 25%, transparent 50%, rgba(255,255,255,0.15) 50%, rgba(255,255,255,0.15) 75%, transparent 75%)",
-                    "Seascape": "repeating-linear-gradient(90deg, transparent, transparent 3px, rgba(255,255,255,0.1) 3px, rgba(255,255,255,0.1) 6px)",
-                    "Portrait": "radial-gradient(ellipse at center, rgba(255,255,255,0.2) 30%, transparent 60%)",
-                    "Still Life": "radial-gradient(circle at 50% 50%, rgba(255,255,255,0.1) 10%, transparent 40%)"
-                }};
-                return patterns[style] || "";
-            }}
-            
-            function updateStats() {{
-                document.getElementById('piece-count').textContent = wallArtworks.length;
-                const totalCost = wallArtworks.reduce((sum, art) => sum + art.price, 0);
-                document.getElementById('total-cost').textContent = '$' + totalCost;
-            }}
-            
-            function updateStreamlit() {{
-                // Post message to parent Streamlit app
-                window.parent.postMessage({{
-                    type: 'streamlit:setComponentValue',
-                    value: wallArtworks
-                }}, '*');
-            }}
-            
-            // Remove drag over class when dragging leaves
-            document.getElementById('wall-canvas').addEventListener('dragleave', function(e) {{
-                if (!this.contains(e.relatedTarget)) {{
-                    this.classList.remove('drag-over');
-                }}
-            }});
-            
-            // Prevent default drag behavior on images
-            document.addEventListener('dragover', function(e) {{
-                e.preventDefault();
-            }});
-        </script>
-    </body>
-    </html>
+        if get_thumbnail_url(artwork['image_path'], "palette", manifest):
+            images[artwork['image_path']] = {
+                variant: get_thumbnail_url(artwork['image_path'], variant, manifest) for variant in VARIANTS
+            }
+    return images
+
+@metrics.counted("catalog_state")
+@st.cache_resource(max_entries=2)
+def get_catalog_state(catalog_version, _artworks, _manifest):
+    """URL of the catalog part of the component state, built once per catalog version
+
+    The whole palette is published as JSON assets (see publish_catalog_state),
+    so the component args only carry the state's URL and the browser fetches
+    it once per catalog version. The build step prepublishes it. Filters never
+    republish it: the component is told which of its rows to show instead
+    (see get_palette_filter).
     """
-    return html_content
+    metrics.cache_miss()
+    base_url = get_asset_base_url()
+    name = snapshot_catalog_state(_artworks, base_url)
+    if name is None:
+        name = publish_catalog_state(_artworks, get_image_urls(_artworks, _manifest), get_couch_url(), base_url)
+    metrics.payload("palette_state", os.path.getsize(os.path.join(ASSET_DIR, name)))
+    return asset_url(name, base_url)
+
+@st.cache_resource(max_entries=2)
+def get_palette_rows(catalog_version, _artworks, _manifest):
+    """Row of each artwork in the published palette, by id
+
+    Artworks without an image are left out of the palette, both by
+    get_image_urls and by the build step, so they have no row.
+    """
+    available = (artwork for artwork in _artworks if _manifest.get(artwork['image_path']) is not None)
+    return {artwork['id']: row for row, artwork in enumerate(available)}
+
+@st.cache_resource(max_entries=32)
+def get_palette_runs(catalog_version, filters_key, _rows, _palette_artworks):
+    """(key, runs) of the palette rows a filter shows, computed once per catalog version and filter
+
+    ``runs`` are the rows as flat [start, length, ...] pairs, or None when
+    every artwork is shown.
+    """
+    shown = sorted(_rows[artwork['id']] for artwork in _palette_artworks if artwork['id'] in _rows)
+    runs = None
+    if len(shown) < len(_rows):
+        runs = []
+        for row in shown:
+            if runs and runs[-2] + runs[-1] == row:
+                runs[-1] += 1
+            else:
+                runs += [row, 1]
+    return get_state_hash(runs), runs
+
+def get_palette_filter(catalog_version, filters, rows, palette_artworks):
+    """Which rows of the published palette the component shows, as {'key': ..., 'runs': ...}
+
+    The runs are sent only when they differ from what the component was last
+    sent; otherwise the arg carries just their key.
+    """
+    key, runs = get_palette_runs(catalog_version, get_state_hash(filters), rows, palette_artworks)
+    if key == st.session_state.get('client_palette_key'):
+        return {'key': key}
+    st.session_state.client_palette_key = key
+    metrics.payload("palette_filter", len(json.dumps(runs)))
+    return {'key': key, 'runs': runs}
+
+def sync_wall(catalog_index, manifest, history):
+    """Apply the component's pending patch to the session's wall and record it as one undo step
+
+    Returns the wall state to send back: the full wall when the component does
+    not hold the current version, otherwise None.
+    """
+    wall = st.session_state.selected_artworks
+    patch = st.session_state.get('wall_patch')
+    if isinstance(patch, dict):
+        changes = []
+        seq, sync = apply_patch(wall, patch, catalog_index.by_id, st.session_state.wall_seq, changes)
+        history.record(wall, changes)
+        if seq > st.session_state.wall_seq:
+            st.session_state.wall_seq = seq
+            # The component already shows its own edits
+            st.session_state.client_wall_version = None if sync else wall_version(wall)
+            if sync:
+                st.session_state.client_palette_key = None
+
+    version = wall_version(wall)
+    if version == st.session_state.client_wall_version:
+        return None
+    st.session_state.client_wall_version = version
+    return {'version': version, 'artworks': wall, 'images': get_image_urls(wall, manifest)}
+
+@st.cache_resource(max_entries=2)
+def get_asset_manifest(catalog_version, _artworks):
+    """Resolved paths, hashes and sizes of the catalog images, built once per catalog version
+
+    Missing or mismatched images are reported to the server log when it is built.
+    """
+    with metrics.span("build_manifest"):
+        manifest = build_manifest([artwork['image_path'] for artwork in _artworks])
+    for line in manifest.report(_artworks):
+        print(f"gallery assets: {line}", file=sys.stderr)
+    return manifest
+
+@st.cache_resource(max_entries=2)
+def get_catalog_index(catalog_version, _artworks):
+    """Search indexes over the catalog, built once per catalog version"""
+    return CatalogIndex(_artworks)
+
+@st.cache_resource(max_entries=2)
+def get_colour_index(catalog_version, _artworks, _manifest):
+    """Colour features and a nearest-neighbour index over the catalog, built once per catalog version"""
+    from features import ColourIndex, update_features
+
+    with metrics.span("colour_index"):
+        # The inline backlog is small: compute it here rather than start a process pool
+        store = update_features(_manifest, workers=1, max_new=FEATURES_INLINE_LIMIT)
+        return ColourIndex(_artworks, _manifest, store)
+
+DESIGN_PAGE_SIZE = 20
+# Picker label -> (sort field, descending)
+DESIGN_SORTS = {
+    "Newest first": ("created_date", True),
+    "Oldest first": ("created_date", False),
+    "Name": ("name", False),
+    "Price: low to high": ("total_cost", False),
+    "Price: high to low": ("total_cost", True),
+}
+
+def get_design_picker(storage):
+    """Search, sort and page through saved designs; returns the chosen design id or None
+
+    Only the page shown is fetched. The storage backend searches and pages
+    (SQLite through its indexes, JSON through an in-process index that it
+    keeps up to date with each new design), so saving a design rebuilds
+    nothing.
+    """
+    search_col, sort_col, page_col = st.columns([2, 2, 1])
+    text = search_col.text_input("Search designs", placeholder="e.g. living room")
+    sort, descending = DESIGN_SORTS[sort_col.selectbox("Sort by", list(DESIGN_SORTS))]
+    with metrics.span("design_page"):
+        designs, total = storage.page_designs(text, sort, descending, 0, DESIGN_PAGE_SIZE)
+    pages = max(1, math.ceil(total / DESIGN_PAGE_SIZE))
+    if pages > 1:
+        page = page_col.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1)
+        if page > 1:
+            with metrics.span("design_page"):
+                designs, total = storage.page_designs(text, sort, descending, page - 1, DESIGN_PAGE_SIZE)
+    labels = {design['id']: design_label(design) for design in designs}
+    return st.selectbox(
+        f"Choose a design ({total} found):",
+        options=[None] + list(labels),
+        format_func=lambda key: "Select a design..." if key is None else labels.get(key, key)
+    )
+
+def get_catalog_filters(index):
+    """Sidebar filter widgets; returns keyword arguments for CatalogIndex.query"""
+    st.sidebar.markdown("### 🔍 Browse Artworks")
+    filters = {
+        'text': st.sidebar.text_input("Search titles", placeholder="e.g. mountain"),
+        'styles': st.sidebar.multiselect("Style", index.styles),
+        'artists': st.sidebar.multiselect("Artist", index.artists),
+    }
+    for field, label in (('price', "Price ($)"), ('width', "Width (in)"), ('height', "Height (in)")):
+        low, high = index.bounds(field)
+        if isinstance(low, float) or isinstance(high, float):
+            low, high = float(low), float(high)
+        if low < high:
+            selected = st.sidebar.slider(label, low, high, (low, high))
+            # An untouched slider is no filter at all, so it never drives the query
+            if selected != (low, high):
+                filters[field] = selected
+    return filters
+
+SHARE_SCALE = 2.0
+PREVIEW_SCALE = 0.4
+# Shared images of large walls are scaled down to at most this many pixels wide
+MAX_SHARE_WIDTH = 4096
+# A session keeps its share renderer (and its RGB canvas) only up to this size
+MAX_SESSION_CANVAS_BYTES = int(os.environ.get("GALLERY_SESSION_CANVAS_BYTES", 8 << 20))
+
+# Wall size limits in feet
+WALL_WIDTH_FT = (7.0, 120.0)
+WALL_HEIGHT_FT = (5.0, 30.0)
+
+def feet(units):
+    return round(units / (12 * SCALE), 2)
+
+def get_wall_controls():
+    """Sidebar wall size inputs; returns (width, height) in canvas units
+
+    A loaded design sets them through st.session_state.pending_wall, since
+    widget values can only be changed before the widgets are drawn.
+    """
+    pending = st.session_state.pop('pending_wall', None)
+    if pending is not None:
+        st.session_state.wall_width_ft = min(max(feet(pending[0]), WALL_WIDTH_FT[0]), WALL_WIDTH_FT[1])
+        st.session_state.wall_height_ft = min(max(feet(pending[1]), WALL_HEIGHT_FT[0]), WALL_HEIGHT_FT[1])
+    st.session_state.setdefault('wall_width_ft', feet(WALL_WIDTH))
+    st.session_state.setdefault('wall_height_ft', feet(WALL_HEIGHT))
+    st.sidebar.markdown("### 🧱 Wall")
+    col1, col2 = st.sidebar.columns(2)
+    width = col1.number_input("Width (ft)", *WALL_WIDTH_FT, step=0.5, key='wall_width_ft')
+    height = col2.number_input("Height (ft)", *WALL_HEIGHT_FT, step=0.5, key='wall_height_ft')
+    return round(width * 12 * SCALE), round(height * 12 * SCALE)
+
+def wall_options(wall):
+    """Keyword arguments describing a (width, height) wall for layout and validation functions"""
+    width, height = wall
+    return {'wall_width': width, 'wall_height': height, 'obstacles': (couch_rect(width, height),)}
+
+def get_wall_png(artworks, wall, manifest):
+    """Callable that renders the wall to PNG for sharing, for st.download_button
+
+    Nothing is rendered until the button is clicked. Streamlit then calls it
+    on another thread, so it works on a copy of the pieces taken now. The
+    session keeps its WallRenderer between downloads, so after a few moves
+    only the affected regions of the canvas are redrawn. A renderer whose
+    canvas is larger than MAX_SESSION_CANVAS_BYTES is not kept.
+    """
+    pieces = [dict(artwork) for artwork in artworks]
+    state = st.session_state.setdefault('wall_png', {'lock': threading.Lock(), 'renderer': None})
+
+    def render():
+        with metrics.span("wall_png"), state['lock']:
+            renderer = state['renderer']
+            if renderer is None or renderer.wall != wall or renderer.manifest is not manifest:
+                from render import WallRenderer
+                renderer = WallRenderer(min(SHARE_SCALE, MAX_SHARE_WIDTH / wall[0]), *wall, manifest)
+            png = renderer.render_bytes(pieces)
+            width, height = renderer.size
+            state['renderer'] = renderer if width * height * 3 <= MAX_SESSION_CANVAS_BYTES else None
+            return png
+    return render
+
+@metrics.counted("design_preview")
+@st.cache_data(max_entries=256, show_spinner=False)
+def get_design_preview(design_id, catalog_version, placements_version, wall, _artworks, _manifest):
+    """Small rendered preview of a saved design, no wider than the default wall's"""
+    metrics.cache_miss()
+    from render import render_wall
+
+    return render_wall(_artworks, PREVIEW_SCALE * WALL_WIDTH / max(wall[0], WALL_WIDTH), "WEBP", *wall, _manifest)
+
+def record_wall_edit():
+    """Record a server-side edit of the wall (Auto-Arrange, Load, ...) as one undo step
+
+    These edits can rewrite the whole wall, so the history compares it with
+    the wall it last recorded.
+    """
+    st.session_state.history.record(st.session_state.selected_artworks)
+
+def hang_selection(selection, wall):
+    """Place a budget Selection on the wall with the skyline layout
+
+    Returns (wall artworks, number of pieces that did not fit).
+    """
+    layout = arrange(selection.artworks, "Skyline packing", **wall_options(wall))
+    wall_artworks = [
+        dict(artwork, wall_x=layout.placements[artwork['id']][0], wall_y=layout.placements[artwork['id']][1])
+        for artwork in selection.artworks
+        if artwork['id'] in layout.placements
+    ]
+    return wall_artworks, len(layout.unplaced)
+
+def get_budget_controls(palette_artworks, wall):
+    """Sidebar widgets that fill the wall within a budget from the filtered catalog"""
+    st.sidebar.markdown("### 💰 Fill My Wall")
+    budget = st.sidebar.number_input("Budget ($)", min_value=0, value=1500, step=100)
+    max_per_style = st.sidebar.number_input("Max pieces per style", min_value=0, value=0, help="0 means no limit")
+    min_styles = st.sidebar.number_input("Min different styles", min_value=0, value=0)
+    if st.sidebar.button("Fill wall within budget", help="Pick the artworks that cover the most wall for the money"):
+        from selection import select_artworks
+
+        st.session_state.budget_selections = select_artworks(
+            palette_artworks, budget, k=BUDGET_ALTERNATIVES,
+            max_per_style=max_per_style or None, min_styles=min_styles, wall_width=wall[0], wall_height=wall[1]
+        )
+        st.session_state.budget_choice = 0
+        if not st.session_state.budget_selections:
+            st.sidebar.warning("No combination of the shown artworks fits that budget.")
+            return
+        use_selection = True
+    else:
+        use_selection = False
+
+    selections = st.session_state.get('budget_selections')
+    if not selections:
+        return
+    choice = st.sidebar.radio(
+        "Selections",
+        range(len(selections)),
+        format_func=lambda i: f"{len(selections[i].artworks)} pieces · ${selections[i].price:,.0f}",
+        key='budget_choice'
+    )
+    if st.sidebar.button("Use this selection") or use_selection:
+        st.session_state.selected_artworks, unplaced = hang_selection(selections[choice], wall)
+        if unplaced:
+            st.session_state.arrange_notice = f"{unplaced} piece(s) of the selection did not fit on the wall and were left out."
+        record_wall_edit()
+        st.rerun()
+
+def show_recommendations(colour_index, manifest, palette_artworks, wall):
+    """Artworks from the filtered catalog whose colours go with the wall, each with an Add button"""
+    with metrics.span("recommend"):
+        matches = colour_index.recommend(
+            st.session_state.selected_artworks, RECOMMENDATIONS, {artwork['id'] for artwork in palette_artworks}
+        )
+    if not matches:
+        return
+    st.markdown("### 🎨 Goes Well With Your Wall")
+    for col, (artwork, similarity) in zip(st.columns(RECOMMENDATIONS), matches):
+        with col:
+            asset = manifest.get(artwork['image_path'])
+            thumbnail = get_thumbnail(asset.resolved, "palette", asset.sha256)
+            if thumbnail:
+                st.image(thumbnail[0])
+            st.caption(f"**{artwork['title']}** · {artwork['style']} · ${artwork['price']} · {similarity:.0%} colour match")
+            if st.button("Add", key=f"recommend_{artwork['id']}", help="Hang it in the first free spot"):
+                spot = find_free_spot(st.session_state.selected_artworks, artwork, **wall_options(wall))
+                if spot is None:
+                    st.session_state.arrange_notice = f"There is no free spot for '{artwork['title']}' on the wall."
+                else:
+                    st.session_state.selected_artworks.append(dict(artwork, wall_x=spot[0], wall_y=spot[1]))
+                    record_wall_edit()
+                st.rerun()
+
+DEBUG_PANEL = os.environ.get("GALLERY_DEBUG") == "1"
+
+def show_debug_panel(manifest, artworks):
+    """Where this run's time went, plus process-wide percentiles and cache hit ratios
+
+    Shown with GALLERY_DEBUG=1 or the ?debug=1 query parameter.
+    """
+    if not (DEBUG_PANEL or st.query_params.get("debug") == "1"):
+        return
+    with st.expander("🛠️ Performance", expanded=True):
+        st.markdown("**This run so far**")
+        st.table([
+            {'span': name, 'ms': "" if ms is None else f"{ms:.2f}", 'note': note}
+            for name, ms, note in metrics.current_trace()
+        ])
+        st.markdown("**Since the server started** (p50/p95 over recent samples)")
+        rows = []
+        for name in metrics.span_names():
+            count, p50, p95 = metrics.SPANS.summary(name)
+            rows.append({'span': name, 'count': count, 'p50 ms': f"{p50 * 1000:.2f}", 'p95 ms': f"{p95 * 1000:.2f}"})
+        st.table(rows)
+        st.markdown("**Cache hit ratios**")
+        st.table([
+            {'cache': cache, 'hits': hits, 'misses': misses, 'hit ratio': f"{hits / (hits + misses):.0%}"}
+            for cache, (hits, misses) in sorted(metrics.cache_ratios().items())
+        ])
+        problems = manifest.report(artworks)
+        st.markdown(f"**Asset problems** ({len(problems)})")
+        for line in problems:
+            st.caption(line)
 
 def main():
+    st.set_page_config(
+        page_title="Gallery Wall Designer",
+        page_icon="🖼️",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
+    start_metrics_export()
     st.title("🖼️ Gallery Wall Designer")
     st.markdown("**Create your perfect gallery wall with drag and drop!**")
     
     # Load data
-    db = load_database()
-    artworks = db['artworks']
-    saved_designs = db['gallery_designs']
+    catalog_token = get_catalog_token()
+    artworks = load_catalog(catalog_token)
     
     # Initialize session state
     if 'selected_artworks' not in st.session_state:
         st.session_state.selected_artworks = []
     if 'current_design_name' not in st.session_state:
         st.session_state.current_design_name = ""
+    if 'wall_seq' not in st.session_state:
+        st.session_state.wall_seq = 0
+        st.session_state.client_wall_version = None
     
-    # Create drag and drop interface
-    drag_drop_html = get_drag_drop_html(artworks, st.session_state.selected_artworks)
+    # Filter the catalog shown in the palette
+    catalog_version = get_catalog_version(catalog_token)
+    catalog_index = get_catalog_index(catalog_version, artworks)
+    manifest = get_asset_manifest(catalog_version, artworks)
+    filters = get_catalog_filters(catalog_index)
+    palette_artworks = catalog_index.query(**filters)
+    st.sidebar.caption(f"Showing {len(palette_artworks)} of {len(artworks)} artworks")
+    wall = get_wall_controls()
     
-    # Display the drag and drop component
-    component_value = components.html(
-        drag_drop_html,
-        height=650,
-        scrolling=False
-    )
+    # Apply edits made on the wall since the last run; they become one undo step
+    history = st.session_state.setdefault('history', History())
+    with metrics.span("sync_wall"):
+        wall_state = sync_wall(catalog_index, manifest, history)
+    get_budget_controls(palette_artworks, wall)
     
-    # Update selected artworks based on component feedback
-    if component_value and isinstance(component_value, list):
-        st.session_state.selected_artworks = component_value
+    # Display the drag and drop component
+    catalog_state = get_catalog_state(catalog_version, artworks, manifest)
+    palette_filter = get_palette_filter(catalog_version, filters, get_palette_rows(catalog_version, artworks, manifest),
+                                        palette_artworks)
+    if wall_state is not None:
+        metrics.payload("wall", len(json.dumps(wall_state)))
+    with metrics.span("wall_component"):
+        wall_component(
+            catalog=catalog_state,
+            palette=palette_filter,
+            wall=wall_state,
+            ack=st.session_state.wall_seq,
+            batch_ms=WALL_BATCH_MS,
+            wall_size={'width': wall[0], 'height': wall[1], 'couch': couch_rect(*wall), 'units_per_inch': SCALE},
+            wall_variants=WALL_VARIANTS,
+            key='wall_patch',
+            default=None
+        )
     
     # Controls section
     st.markdown("---")
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        if st.button("🎯 Auto-Arrange", help="Arrange artworks in a grid pattern"):
+        layout_strategy = st.selectbox("Layout", list(LAYOUT_STRATEGIES), label_visibility="collapsed")
+        if st.button("🎯 Auto-Arrange", help="Arrange artworks by their real sizes without overlaps"):
+            if st.session_state.selected_artworks:
+                layout = arrange(st.session_state.selected_artworks, layout_strategy, **wall_options(wall))
+                for artwork in st.session_state.selected_artworks:
+                    if artwork['id'] in layout.placements:
+                        artwork['wall_x'], artwork['wall_y'] = layout.placements[artwork['id']]
+                if layout.unplaced:
+                    problems = validate_layout(st.session_state.selected_artworks, **wall_options(wall))
+                    st.session_state.arrange_notice = (
+                        f"{len(layout.unplaced)} piece(s) did not fit on the wall and were left where they were"
+                        + (f" ({describe_problems(problems)})." if problems else ".")
+                    )
+                record_wall_edit()
+                st.rerun()
+        if st.button("✨ Optimize", help=f"Search {OPTIMIZE_BUDGET_MS} ms for a balanced, evenly spaced layout using all CPU cores"):
             if st.session_state.selected_artworks:
-                artworks_per_row = min(3, len(st.session_state.selected_artworks))
-                for i, artwork in enumerate(st.session_state.selected_artworks):
-                    row = i // artworks_per_row
-                    col = i % artworks_per_row
-                    artwork['wall_x'] = 50 + col * 150
-                    artwork['wall_y'] = 50 + row * 120
+                from optimizer import optimize
+
+                progress = st.empty()
+                best = None
+                layouts = optimize(st.session_state.selected_artworks, budget_ms=OPTIMIZE_BUDGET_MS,
+                                   wall_width=wall[0], wall_height=wall[1], couch=couch_rect(*wall))
+                for cost, placements in layouts:
+                    if best is None:
+                        start_cost = cost
+                    best = placements
+                    progress.caption(f"Layout score: {1 / (1 + cost):.3f} (from {1 / (1 + start_cost):.3f})")
+                # The score only penalises overlaps and pieces off the wall, so check the result
+                wall_artworks = st.session_state.selected_artworks
+                start_problems = len(validate_layout(wall_artworks, **wall_options(wall)))
+                previous = [(artwork.get('wall_x', 0), artwork.get('wall_y', 0)) for artwork in wall_artworks]
+                for artwork in wall_artworks:
+                    artwork['wall_x'], artwork['wall_y'] = best[artwork['id']]
+                problems = validate_layout(wall_artworks, **wall_options(wall))
+                if len(problems) > start_problems:
+                    for artwork, (x, y) in zip(wall_artworks, previous):
+                        artwork['wall_x'], artwork['wall_y'] = x, y
+                    st.session_state.arrange_notice = (
+                        f"The optimized layout had more layout issues ({describe_problems(problems)}), "
+                        "so the previous layout was kept."
+                    )
+                record_wall_edit()
                 st.rerun()
+        if 'arrange_notice' in st.session_state:
+            st.warning(st.session_state.pop('arrange_notice'))
     
     with col2:
         if st.button("🗑️ Clear All", help="Remove all artworks from the wall"):
             st.session_state.selected_artworks = []
+            record_wall_edit()
+            st.rerun()
+        undo_col, redo_col = st.columns(2)
+        if undo_col.button("↩️ Undo", disabled=not history.undo_steps,
+                           help=f"Undo: {history.undo_steps[-1].label}" if history.undo_steps else "Nothing to undo"):
+            history.undo(st.session_state.selected_artworks)
+            st.rerun()
+        if redo_col.button("↪️ Redo", disabled=not history.redo_steps,
+                           help=f"Redo: {history.redo_steps[-1].label}" if history.redo_steps else "Nothing to redo"):
+            history.redo(st.session_state.selected_artworks)
             st.rerun()
     
     with col3:
@@ -670,23 +621,18 @@ def main():
     
     with col4:
         if st.button("💾 Save Design", help="Save your current gallery design") and design_name and st.session_state.selected_artworks:
-            new_design = {
-                'id': str(uuid.uuid4()),
-                'name': design_name,
-                'created_date': datetime.now().isoformat(),
-                'artworks': st.session_state.selected_artworks,
-                'total_cost': sum(art['price'] for art in st.session_state.selected_artworks)
-            }
-            
-            db['gallery_designs'].append(new_design)
-            save_database(db)
+            with metrics.span("save_design"):
+                get_storage().add_design(make_design(design_name, st.session_state.selected_artworks, wall))
             st.success(f"Design '{design_name}' saved!")
+            problems = validate_layout(st.session_state.selected_artworks, **wall_options(wall))
+            if problems:
+                st.warning(f"Saved with layout issues: {describe_problems(problems)}.")
             st.session_state.current_design_name = design_name
     
     # Display current selection info
     if st.session_state.selected_artworks:
         st.markdown("### 📊 Current Selection")
-        col1, col2, col3 = st.columns(3)
+        col1, col2, col3, col4 = st.columns(4)
         
         with col1:
             st.metric("Artworks", len(st.session_state.selected_artworks))
@@ -698,27 +644,54 @@ def main():
         with col3:
             styles = set(art['style'] for art in st.session_state.selected_artworks)
             st.metric("Styles", len(styles))
+        
+        with col4:
+            problems = validate_layout(st.session_state.selected_artworks, **wall_options(wall))
+            st.metric("Layout Issues", len(problems), help=describe_problems(problems) or "No overlaps, all pieces on the wall")
+            if st.button("🧲 Snap & Align", help="Snap pieces to aligned edges and even gaps with their neighbours"):
+                if snap_layout(st.session_state.selected_artworks, **wall_options(wall)):
+                    record_wall_edit()
+                    st.rerun()
+        
+        st.download_button(
+            "📷 Download wall image",
+            data=get_wall_png(st.session_state.selected_artworks, wall, manifest),
+            file_name=f"{st.session_state.current_design_name or 'gallery-wall'}.png",
+            mime="image/png",
+            on_click="ignore"
+        )
+        
+        show_recommendations(get_colour_index(catalog_version, artworks, manifest), manifest, palette_artworks, wall)
     
     # Load saved designs
-    if saved_designs:
+    storage = get_storage()
+    if storage.count_designs():
         st.markdown("### 📚 Load Saved Design")
         col1, col2 = st.columns([3, 1])
         
         with col1:
-            selected_design = st.selectbox(
-                "Choose a design:",
-                options=[None] + [f"{design['name']} (${design['total_cost']} - {len(design['artworks'])} pieces)" for design in saved_designs],
-                format_func=lambda x: "Select a design..." if x is None else x
-            )
+            selected_id = get_design_picker(storage)
+            design = storage.get_design(selected_id) if selected_id else None
+            if design:
+                preview_artworks, _ = resolve_design(design, catalog_index.by_id)
+                st.image(get_design_preview(design['id'], catalog_version, wall_version(preview_artworks),
+                                            design_wall(design), preview_artworks, manifest),
+                         caption=design['name'])
         
         with col2:
-            if selected_design and st.button("Load", help="Load the selected design"):
-                design_name = selected_design.split(" (")[0]
-                design = next(d for d in saved_designs if d['name'] == design_name)
-                st.session_state.selected_artworks = design['artworks']
+            if design and st.button("Load", help="Load the selected design"):
+                # Fresh dicts from the current catalog at the saved positions
+                with metrics.span("load_design"):
+                    st.session_state.selected_artworks, missing = resolve_design(design, catalog_index.by_id)
                 st.session_state.current_design_name = design['name']
+                st.session_state.pending_wall = design_wall(design)
+                if missing:
+                    st.toast(f"{len(missing)} pieces of '{design['name']}' are no longer in the catalog")
+                record_wall_edit()
                 st.rerun()
     
+    show_debug_panel(manifest, artworks)
+    
     # Instructions
     with st.expander("ℹ️ How to Use This Gallery Designer"):
         st.markdown("""
@@ -726,13 +699,19 @@ def main():
         1. **Drag & Drop**: Drag colorful artwork thumbnails from the left palette onto the wall
         2. **Reposition**: Drag artworks around the wall to find the perfect arrangement
         3. **Remove**: Double-click any artwork on the wall to remove it
+        4. **Zoom & Pan**: Scroll over the wall to zoom and drag the wall to pan; set its size under **Wall** in the sidebar
+        5. **Undo & Redo**: Step back through any change to the wall, whether dragged, arranged, cleared or loaded
         
         **Features:**
         - 🎨 **Visual Artworks**: Each piece has unique patterns and colors based on its style
         - 🛋️ **Room Context**: See how your gallery looks above a couch
         - 📊 **Live Stats**: Track piece count and total cost in real-time
         - 💾 **Save & Load**: Save your designs and load them later
-        - 🎯 **Auto-Arrange**: Quick grid layout for easy starting point
+        - 🎯 **Auto-Arrange**: Skyline, salon or grid layouts that respect each piece's size
+        - 💰 **Fill My Wall**: Picks the artworks that cover the most wall within your budget
+        - 📷 **Download**: Save a high-resolution image of your wall to share
+        - ✨ **Optimize**: Searches for a balanced, evenly spaced layout centred over the couch
+        - 🎨 **Goes Well With Your Wall**: Suggests artworks whose colours match the pieces you have hung
         
         **Tips:**
         - Try mixing different styles and colors for visual interest
@@ -741,4 +720,6 @@ def main():
         """)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    metrics.start_trace()
+    with metrics.span("rerun"):
+        main()
\ No newline at end of file
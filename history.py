@@ -0,0 +1,218 @@
+"""Undo/redo history of the wall as a log of reversible changes.
+
+A step records only the pieces it changed. Each change is
+``(artwork, before, after)``, where ``before``/``after`` are ``(index, x, y)``
+or None when the piece was not on the wall. ``artwork`` is a reference to the
+artwork dict, shared with the wall and with other steps, never a copy. A step
+can be applied both ways, so no full-wall checkpoints are needed: undoing or
+redoing costs time and memory in proportion to the step, whatever the size
+of the wall.
+
+Edits made in the component arrive as patch ops, and ``wall_state.apply_patch``
+turns each op it applies into one change. ``History.record`` stores those as
+an ordered step, replayed one change at a time, so recording an edit costs
+time in proportion to the ops, not the wall. Server-side edits that rewrite
+the wall (Auto-Arrange, Optimize, Load, Clear All, ...) are recorded without
+changes: the step is then found by comparing the wall with the placements
+the history last saw. Steps are dropped
+oldest first once their estimated size passes ``max_bytes``; the newest step
+is always kept, so even a large Clear All can be undone.
+"""
+import os
+import sys
+from collections import deque, namedtuple
+
+MAX_HISTORY_BYTES = int(os.environ.get("GALLERY_HISTORY_BYTES", 1 << 20))
+
+Step = namedtuple("Step", ["label", "changes", "size", "ordered"], defaults=(False,))
+Step.__doc__ = (
+    "changes is a tuple of (artwork, before, after); size is its estimated memory in bytes. "
+    "An ordered step's changes were made one after another and are applied in turn."
+)
+
+
+def _placement(artwork):
+    return artwork, artwork.get("wall_x", 0), artwork.get("wall_y", 0)
+
+
+def _estimate_size(changes):
+    """Bytes held by a step's own objects; the shared artwork dicts are not counted"""
+    size = sys.getsizeof(changes)
+    for change in changes:
+        size += sys.getsizeof(change) + sum(sys.getsizeof(side) for side in change[1:] if side is not None)
+    return size
+
+
+def describe_changes(changes):
+    """Short description of a step, e.g. "move 2 pieces" or "add 1 piece, remove 3 pieces\""""
+    counts = {"add": 0, "move": 0, "remove": 0}
+    for _, before, after in changes:
+        counts["add" if before is None else "remove" if after is None else "move"] += 1
+    parts = [f"{verb} {count} piece{'s' if count != 1 else ''}" for verb, count in counts.items() if count]
+    return ", ".join(parts)
+
+
+def diff_walls(old, new):
+    """Changes turning the placements old (a list of (artwork, x, y)) into the wall new
+
+    Pieces that stay keep their relative order in every edit the app makes.
+    When they do not, the whole wall is recorded as replaced.
+    """
+    if len(old) == len(new) and all(entry[0]["id"] == artwork["id"] for entry, artwork in zip(old, new)):
+        # Same pieces in the same order, the common case: only moves
+        return tuple(
+            (artwork, (i, x, y), (i, artwork.get("wall_x", 0), artwork.get("wall_y", 0)))
+            for i, ((_, x, y), artwork) in enumerate(zip(old, new))
+            if (x, y) != (artwork.get("wall_x", 0), artwork.get("wall_y", 0))
+        )
+    new_ids = {artwork["id"] for artwork in new}
+    old_ids = {artwork["id"] for artwork, _, _ in old}
+    kept_old = [entry for entry in old if entry[0]["id"] in new_ids]
+    kept_new = [artwork for artwork in new if artwork["id"] in old_ids]
+    if [entry[0]["id"] for entry in kept_old] != [artwork["id"] for artwork in kept_new]:
+        return tuple(
+            [(artwork, (i, x, y), None) for i, (artwork, x, y) in enumerate(old)]
+            + [(artwork, None, (i, *_placement(artwork)[1:])) for i, artwork in enumerate(new)]
+        )
+
+    changes = [(artwork, (i, x, y), None) for i, (artwork, x, y) in enumerate(old) if artwork["id"] not in new_ids]
+    position = {id(artwork): i for i, artwork in enumerate(new)}
+    old_index = {artwork["id"]: i for i, (artwork, _, _) in enumerate(old)}
+    for (_, x, y), artwork in zip(kept_old, kept_new):
+        new_x, new_y = artwork.get("wall_x", 0), artwork.get("wall_y", 0)
+        if (x, y) != (new_x, new_y):
+            changes.append((artwork, (old_index[artwork["id"]], x, y), (position[id(artwork)], new_x, new_y)))
+    changes += [
+        (artwork, None, (i, *_placement(artwork)[1:])) for i, artwork in enumerate(new) if artwork["id"] not in old_ids
+    ]
+    return tuple(changes)
+
+
+def _matches(wall, index, artwork):
+    return index < len(wall) and wall[index]["id"] == artwork["id"]
+
+
+def apply_changes(wall, placements, changes, reverse=False):
+    """Apply a step's changes (or undo them) to the wall and to the matching placements list
+
+    Removals go first from the highest index down, then additions from the
+    lowest index up, so every index refers to the list as it is at that moment;
+    moves are applied last, at their final index. Returns False when the wall
+    turns out not to match the step, which may leave it partly changed.
+    """
+    start, end = (2, 1) if reverse else (1, 2)
+    removed = sorted((c for c in changes if c[end] is None), key=lambda c: -c[start][0])
+    added = sorted((c for c in changes if c[start] is None), key=lambda c: c[end][0])
+    moved = [c for c in changes if c[start] is not None and c[end] is not None]
+
+    if not all(_matches(wall, change[start][0], change[0]) for change in removed):
+        return False
+    for change in removed:
+        index = change[start][0]
+        del wall[index]
+        del placements[index]
+    for artwork, *sides in added:
+        index, x, y = sides[end - 1]
+        artwork["wall_x"], artwork["wall_y"] = x, y
+        wall.insert(index, artwork)
+        placements.insert(index, (artwork, x, y))
+    for artwork, *sides in moved:
+        index, x, y = sides[end - 1]
+        if not _matches(wall, index, artwork):
+            return False
+        piece = wall[index]
+        piece["wall_x"], piece["wall_y"] = x, y
+        placements[index] = (piece, x, y)
+    return True
+
+
+def apply_ordered_changes(wall, placements, changes, reverse=False):
+    """Apply (or undo, last first) changes that were made one after another; see apply_changes"""
+    for change in reversed(changes) if reverse else changes:
+        if not apply_changes(wall, placements, (change,), reverse):
+            return False
+    return True
+
+
+class History:
+    """Undo and redo stacks of wall steps, capped by their estimated memory"""
+
+    def __init__(self, max_bytes=MAX_HISTORY_BYTES):
+        self.max_bytes = max_bytes
+        self.undo_steps = deque()
+        self.redo_steps = []
+        self.size = 0
+        self.placements = []  # (artwork, x, y) of the wall as last recorded
+
+    def record(self, wall, changes=None):
+        """Add a step for what changed on the wall since the last call; returns the step or None
+
+        changes are the ordered changes of the patch ops applied since then,
+        from ``apply_patch``. Without them the whole wall is compared with the
+        placements last recorded.
+        """
+        if changes is not None:
+            grown = sum((after is not None) - (before is not None) for _, before, after in changes)
+            if len(self.placements) + grown == len(wall):
+                return self._record_ordered(tuple(changes))
+            # The wall was also changed some other way: compare it whole
+        changes = diff_walls(self.placements, wall)
+        if all(before is not None and after is not None for _, before, after in changes):
+            for artwork, _, (index, x, y) in changes:
+                self.placements[index] = (artwork, x, y)
+            # Load may have swapped in fresh dicts at the same places
+            if any(entry[0] is not artwork for entry, artwork in zip(self.placements, wall)):
+                self.placements = [_placement(artwork) for artwork in wall]
+        else:
+            self.placements = [_placement(artwork) for artwork in wall]
+        if not changes:
+            return None
+        return self._push(Step(describe_changes(changes), changes, _estimate_size(changes)))
+
+    def _record_ordered(self, changes):
+        if not changes:
+            return None
+        for artwork, before, after in changes:
+            if before is None:
+                self.placements.insert(after[0], (artwork, *after[1:]))
+            elif after is None:
+                del self.placements[before[0]]
+            else:
+                self.placements[after[0]] = (artwork, *after[1:])
+        return self._push(Step(describe_changes(changes), changes, _estimate_size(changes), True))
+
+    def _push(self, step):
+        self.size -= sum(redo.size for redo in self.redo_steps)
+        self.redo_steps.clear()
+        self.undo_steps.append(step)
+        self.size += step.size
+        while self.size > self.max_bytes and len(self.undo_steps) > 1:
+            self.size -= self.undo_steps.popleft().size
+        return step
+
+    def undo(self, wall):
+        """Undo the newest step on the wall in place; returns it, or None if there is nothing to undo"""
+        return self._move(wall, self.undo_steps, self.redo_steps, reverse=True)
+
+    def redo(self, wall):
+        """Redo the newest undone step on the wall in place; returns it, or None if there is nothing to redo"""
+        return self._move(wall, self.redo_steps, self.undo_steps, reverse=False)
+
+    def _move(self, wall, source, target, reverse):
+        if not source:
+            return None
+        step = source.pop()
+        apply = apply_ordered_changes if step.ordered else apply_changes
+        if not apply(wall, self.placements, step.changes, reverse):
+            # The wall was changed behind the history's back; start over from here
+            self.clear(wall)
+            return None
+        target.append(step)
+        return step
+
+    def clear(self, wall=()):
+        """Forget every step and start recording from the given wall"""
+        self.undo_steps.clear()
+        self.redo_steps.clear()
+        self.size = 0
+        self.placements = [_placement(artwork) for artwork in wall]
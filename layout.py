@@ -0,0 +1,232 @@
+"""Size-aware auto-arrange strategies for the gallery wall.
+
+All coordinates are wall-canvas pixels with the origin at the top-left
+corner, matching ``wall_x``/``wall_y`` in the component. A canvas pixel is a
+quarter inch of real wall (``SCALE`` per inch) whatever the on-screen zoom,
+and walls of any size are laid out by passing ``wall_width``/``wall_height``
+and the couch from ``couch_rect``. A piece occupies ``width * SCALE`` by
+``height * SCALE`` pixels; its frame is drawn inside that box, so
+``frame_width`` does not change the footprint.
+
+Every strategy returns a ``Layout`` whose placements never overlap each
+other, the couch, or the wall edges. Pieces that cannot fit are listed in
+``unplaced`` rather than being stacked on top of others.
+"""
+import math
+from collections import namedtuple
+
+SCALE = 4  # canvas pixels per inch
+WALL_WIDTH = 900
+WALL_HEIGHT = 500
+MARGIN = 10
+GAP = 20
+
+Layout = namedtuple("Layout", ["placements", "unplaced"])
+Layout.__doc__ = "placements maps artwork id -> (x, y); unplaced lists ids that did not fit"
+
+
+def couch_rect(wall_width=WALL_WIDTH, wall_height=WALL_HEIGHT):
+    """The 300x120 px couch, centred, 10 px above the bottom edge of a wall"""
+    return (wall_width // 2 - 150, wall_height - 130, 300, 120)
+
+
+COUCH = couch_rect()
+
+
+def piece_size(artwork):
+    """Footprint of an artwork on the canvas in pixels"""
+    return artwork["width"] * SCALE, artwork["height"] * SCALE
+
+
+def rects_overlap(a, b):
+    """Whether two (x, y, w, h) rectangles overlap (touching edges do not count)"""
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+
+def _free_height(wall_height, obstacles, margin):
+    """Height of the band above the highest obstacle, where centred layouts go"""
+    top = min((obstacle[1] for obstacle in obstacles), default=wall_height)
+    return min(wall_height, top) - margin
+
+
+def _split_oversized(artworks, max_width, max_height):
+    """Separate pieces that could never fit in a max_width x max_height area"""
+    fitting, oversized = [], []
+    for artwork in artworks:
+        width, height = piece_size(artwork)
+        if width <= max_width and height <= max_height:
+            fitting.append(artwork)
+        else:
+            oversized.append(artwork["id"])
+    return fitting, oversized
+
+
+def skyline(artworks, wall_width=WALL_WIDTH, wall_height=WALL_HEIGHT, obstacles=(COUCH,), gap=GAP, margin=MARGIN):
+    """Bottom-left skyline packing from the top of the wall, tallest pieces first
+
+    The skyline is a list of [x, width, y] segments giving the lowest occupied
+    edge across the wall. Each piece goes where its bottom edge ends up
+    highest, and the segments it covers are merged, so the segment count stays
+    small and placement is close to linear in the number of pieces.
+    """
+    inner_width = wall_width - 2 * margin
+    segments = [[margin, inner_width, margin]]
+    placements = {}
+    unplaced = []
+    blocked = [(x - gap, y - gap, w + 2 * gap, h + 2 * gap) for x, y, w, h in obstacles]
+
+    for artwork in sorted(artworks, key=lambda a: (-a["height"], -a["width"])):
+        width, height = piece_size(artwork)
+        best = None
+        for i in range(len(segments)):
+            x = segments[i][0]
+            if x + width > margin + inner_width:
+                break
+            # The piece rests on the highest segment it spans
+            y, j, covered = 0, i, 0
+            while covered < width + gap and j < len(segments):
+                y = max(y, segments[j][2])
+                covered = segments[j][0] + segments[j][1] - x
+                j += 1
+            rect = (x, y, width, height)
+            if y + height > wall_height - margin or any(rects_overlap(rect, b) for b in blocked):
+                continue
+            if best is None or (y + height, x) < (best[1] + height, best[0]):
+                best = (x, y)
+        if best is None:
+            unplaced.append(artwork["id"])
+            continue
+
+        x, y = best
+        placements[artwork["id"]] = (x, y)
+        _raise_skyline(segments, x, width + gap, y + height + gap)
+
+    return Layout(placements, unplaced)
+
+
+def _raise_skyline(segments, x, width, y):
+    """Set the skyline to y over [x, x + width) and merge equal neighbours"""
+    end = min(x + width, segments[-1][0] + segments[-1][1])
+    updated = []
+    for seg_x, seg_w, seg_y in segments:
+        seg_end = seg_x + seg_w
+        if seg_end <= x or seg_x >= end:
+            updated.append([seg_x, seg_w, seg_y])
+            continue
+        if seg_x < x:
+            updated.append([seg_x, x - seg_x, seg_y])
+        if seg_x <= x:
+            updated.append([x, end - x, y])
+        if seg_end > end:
+            updated.append([end, seg_end - end, seg_y])
+    merged = []
+    for segment in updated:
+        if merged and merged[-1][2] == segment[2]:
+            merged[-1][1] += segment[1]
+        else:
+            merged.append(segment)
+    segments[:] = merged
+
+
+def salon(artworks, wall_width=WALL_WIDTH, wall_height=WALL_HEIGHT, obstacles=(COUCH,), gap=GAP, margin=MARGIN):
+    """Salon-style cluster: rows centred on each other, the block centred on the eyeline
+
+    The eyeline is the middle of the band above the couch. Rows are filled to a
+    target width close to the square root of the total area, so the cluster
+    comes out roughly as wide as it is tall.
+    """
+    band_height = _free_height(wall_height, obstacles, margin) - margin
+    max_row_width = wall_width - 2 * margin
+    artworks, oversized = _split_oversized(artworks, max_row_width, band_height)
+    sizes = {artwork["id"]: piece_size(artwork) for artwork in artworks}
+    total_area = sum((w + gap) * (h + gap) for w, h in sizes.values())
+    target_width = min(max_row_width, max(math.sqrt(total_area * 1.6),
+                                          max((w for w, _ in sizes.values()), default=0)))
+
+    # Alternate large and small pieces so rows mix scales, as in a salon hang
+    by_area = sorted(artworks, key=lambda a: -sizes[a["id"]][0] * sizes[a["id"]][1])
+    ordered = []
+    while by_area:
+        ordered.append(by_area.pop(0))
+        if by_area:
+            ordered.append(by_area.pop())
+
+    rows, row, row_width = [], [], 0
+    for artwork in ordered:
+        width, _ = sizes[artwork["id"]]
+        extra = width + (gap if row else 0)
+        if row and row_width + extra > target_width:
+            rows.append(row)
+            row, row_width, extra = [], 0, width
+        row.append(artwork)
+        row_width += extra
+    if row:
+        rows.append(row)
+
+    placements = {}
+    unplaced = oversized
+    row_heights = [max(sizes[a["id"]][1] for a in r) for r in rows]
+    # Drop whole rows from the bottom until the block fits in the band
+    while rows and sum(row_heights) + gap * (len(rows) - 1) > band_height:
+        unplaced.extend(a["id"] for a in rows.pop())
+        row_heights.pop()
+    block_height = sum(row_heights) + gap * (len(rows) - 1)
+    y = margin + max(0, (band_height - block_height) / 2)
+    for r, row_height in zip(rows, row_heights):
+        width = sum(sizes[a["id"]][0] for a in r) + gap * (len(r) - 1)
+        x = (wall_width - width) / 2
+        for artwork in r:
+            w, h = sizes[artwork["id"]]
+            placements[artwork["id"]] = (round(x), round(y + (row_height - h) / 2))
+            x += w + gap
+        y += row_height + gap
+    return Layout(placements, unplaced)
+
+
+def grid(artworks, wall_width=WALL_WIDTH, wall_height=WALL_HEIGHT, obstacles=(COUCH,), gap=GAP, margin=MARGIN):
+    """Symmetric grid of equal cells sized to the largest piece, centred above the couch"""
+    band_height = _free_height(wall_height, obstacles, margin) - margin
+    artworks, oversized = _split_oversized(artworks, wall_width - 2 * margin, band_height)
+    if not artworks:
+        return Layout({}, oversized)
+    sizes = {artwork["id"]: piece_size(artwork) for artwork in artworks}
+    cell_w = max(w for w, _ in sizes.values())
+    cell_h = max(h for _, h in sizes.values())
+
+    max_cols = max(1, (wall_width - 2 * margin + gap) // (cell_w + gap))
+    max_rows = max(0, (band_height + gap) // (cell_h + gap))
+    count = len(artworks)
+    # Closest to square that the wall allows
+    cols = min(max_cols, max(1, math.ceil(math.sqrt(count * cell_h / cell_w))))
+    rows = min(max_rows, math.ceil(count / cols))
+
+    placements = {}
+    unplaced = oversized
+    fitted = artworks[:rows * cols]
+    unplaced.extend(artwork["id"] for artwork in artworks[rows * cols:])
+    grid_width = cols * cell_w + (cols - 1) * gap
+    grid_height = rows * cell_h + (rows - 1) * gap
+    top = margin + max(0, (band_height - grid_height) / 2)
+    left = (wall_width - grid_width) / 2
+    for i, artwork in enumerate(fitted):
+        row, col = divmod(i, cols)
+        # Centre a short last row so the grid stays symmetric
+        in_row = min(cols, len(fitted) - row * cols)
+        row_left = left + (cols - in_row) * (cell_w + gap) / 2
+        w, h = sizes[artwork["id"]]
+        x = row_left + col * (cell_w + gap) + (cell_w - w) / 2
+        y = top + row * (cell_h + gap) + (cell_h - h) / 2
+        placements[artwork["id"]] = (round(x), round(y))
+    return Layout(placements, unplaced)
+
+
+STRATEGIES = {
+    "Skyline packing": skyline,
+    "Salon (eyeline)": salon,
+    "Symmetric grid": grid,
+}
+
+
+def arrange(artworks, strategy="Skyline packing", **kwargs):
+    """Run one of the named STRATEGIES over a list of artwork dicts"""
+    return STRATEGIES[strategy](artworks, **kwargs)
@@ -0,0 +1,177 @@
+"""Asset manifest: every catalog image resolved, hashed and measured once.
+
+    python manifest.py [storage-url]
+
+Catalog paths are matched against the disk case-insensitively, one path
+component at a time, so ``art/Art/modern.png`` finds ``Art/Art/modern.png`` on
+case-sensitive filesystems. For each image the manifest records the resolved
+path, byte size, mtime, SHA-256, pixel dimensions and format. The header is
+read for the dimensions; the image is not decoded. Files are processed in a
+thread pool (hashing and file reads release the GIL). Results are cached in
+``MANIFEST_CACHE`` and reused while a file's size and mtime are unchanged.
+
+The app builds the manifest once per catalog version and looks images up in
+it, instead of checking and reading files while it renders. ``report`` lists
+missing images, paths whose case differs from the disk and images whose
+proportions do not match the catalog.
+"""
+import json
+import os
+import sys
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from thumbnails import file_hash
+
+MANIFEST_CACHE = os.environ.get("GALLERY_MANIFEST", ".asset_manifest.json")
+# Catalog aspect ratios may differ from the image's by this fraction before it is reported
+ASPECT_TOLERANCE = 0.25
+
+AssetEntry = namedtuple("AssetEntry", ["path", "resolved", "size", "mtime_ns", "sha256", "width", "height", "format"])
+AssetEntry.__doc__ = "path is the catalog path, resolved the file on disk; width/height/format are None if unreadable"
+
+
+@lru_cache(maxsize=1024)
+def _listing(directory, mtime_ns):
+    """Lower-cased name -> names in a directory; keyed by mtime so it refreshes when the directory changes"""
+    names = {}
+    for name in sorted(os.listdir(directory)):
+        names.setdefault(name.lower(), []).append(name)
+    return names
+
+
+def resolve_path(path):
+    """Path of an existing file matching path, ignoring case where needed; None if there is none
+
+    An exact match wins. Otherwise each component is looked up in a cached
+    listing of its directory; among several case variants the first in sorted
+    order is taken.
+    """
+    if os.path.isfile(path):
+        return path
+    head, *parts = os.path.normpath(path).split(os.sep)
+    if head == "":
+        current = os.sep
+    elif os.path.exists(head):
+        current = head
+    else:
+        parts.insert(0, head)
+        current = os.curdir
+    for part in parts:
+        try:
+            names = _listing(current, os.stat(current).st_mtime_ns)
+        except OSError:
+            return None
+        matches = names.get(part.lower())
+        if not matches:
+            return None
+        current = os.path.join(current, part if part in matches else matches[0])
+    if current.startswith(os.curdir + os.sep):
+        current = current[len(os.curdir + os.sep):]
+    return current if os.path.isfile(current) else None
+
+
+def _image_info(path):
+    """(width, height, format) from the image header, or (None, None, None) if unreadable"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None, None, None
+    try:
+        with Image.open(path) as img:
+            return img.width, img.height, img.format
+    except OSError:
+        return None, None, None
+
+
+def _load_cache(cache_path):
+    try:
+        with open(cache_path) as f:
+            return {entry["resolved"]: AssetEntry(**entry) for entry in json.load(f)}
+    except (OSError, ValueError, TypeError, KeyError):
+        return {}
+
+
+class AssetManifest:
+    """Resolved image files and their metadata, by catalog path"""
+
+    def __init__(self, entries, missing):
+        self.entries = entries  # catalog path -> AssetEntry
+        self.missing = missing  # catalog paths with no file
+
+    def get(self, path):
+        """AssetEntry of a catalog path, or None when the file is missing"""
+        return self.entries.get(path)
+
+    @property
+    def renamed(self):
+        """(catalog path, path on disk) pairs that only match ignoring case"""
+        return [(path, entry.resolved) for path, entry in sorted(self.entries.items()) if entry.resolved != path]
+
+    def report(self, artworks=()):
+        """Human-readable problems: missing, case-mismatched, unreadable or misproportioned images"""
+        lines = [f"missing image: {path}" for path in self.missing]
+        lines += [f"path case differs from disk: {path} -> {resolved}" for path, resolved in self.renamed]
+        lines += [f"unreadable image: {path}" for path, entry in sorted(self.entries.items()) if entry.format is None]
+        for artwork in artworks:
+            entry = self.entries.get(artwork.get("image_path"))
+            if entry is None or not entry.width or not artwork.get("width") or not artwork.get("height"):
+                continue
+            expected = artwork["width"] / artwork["height"]
+            actual = entry.width / entry.height
+            if abs(actual / expected - 1) > ASPECT_TOLERANCE:
+                lines.append(f"proportions differ from catalog: {artwork['image_path']} is {entry.width}x{entry.height}"
+                             f" px, catalog says {artwork['width']}x{artwork['height']} in ({artwork.get('title')})")
+        return lines
+
+
+def _measure(path, cached):
+    """AssetEntry for a catalog path, reusing the cached entry while the file is unchanged"""
+    resolved = resolve_path(path)
+    if resolved is None:
+        return path, None
+    stat = os.stat(resolved)
+    entry = cached.get(resolved)
+    if entry is not None and (entry.size, entry.mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+        return path, entry._replace(path=path)
+    width, height, fmt = _image_info(resolved)
+    return path, AssetEntry(path, resolved, stat.st_size, stat.st_mtime_ns, file_hash(resolved), width, height, fmt)
+
+
+def build_manifest(paths, cache_path=MANIFEST_CACHE, workers=None):
+    """Resolve and measure image paths in a thread pool; returns an AssetManifest"""
+    paths = sorted(set(paths))
+    cached = _load_cache(cache_path) if cache_path else {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_measure, paths, [cached] * len(paths)))
+    entries = {path: entry for path, entry in results if entry is not None}
+    missing = [path for path, entry in results if entry is None]
+
+    fresh = {entry.resolved: entry for entry in entries.values()}
+    # The catalog path (field 0) is not part of what the cache records about a file
+    changed = any(key not in cached or cached[key][1:] != entry[1:] for key, entry in fresh.items())
+    if cache_path and changed:
+        # Sessions are threads of one process, so the pid alone is not unique
+        tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump([entry._asdict() for entry in fresh.values()], f)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass
+    return AssetManifest(entries, missing)
+
+
+if __name__ == "__main__":
+    from storage import get_storage
+
+    artworks = get_storage(sys.argv[1] if len(sys.argv) > 1 else None).load_artworks()
+    manifest = build_manifest(artwork["image_path"] for artwork in artworks)
+    problems = manifest.report(artworks)
+    for line in problems:
+        print(line)
+    print(f"{len(manifest.entries)} images found for {len(artworks)} artworks, {len(manifest.missing)} missing",
+          file=sys.stderr)
+    sys.exit(1 if manifest.missing else 0)
@@ -0,0 +1,229 @@
+"""Per-rerun timing spans, cache hit ratios and payload sizes, exported for Prometheus.
+
+Metrics live in one process-wide registry shared by every session:
+
+- ``gallery_span_seconds{span}``: histogram of span durations; the ``rerun``
+  span covers a whole script run
+- ``gallery_cache_requests_total{cache, result}``: cache lookups by hit/miss
+- ``gallery_payload_bytes{payload}``: histogram of data sent to the browser
+
+``span`` times a block. ``cache_lookup`` (or the ``counted`` decorator) times
+a call into a cached function and counts it as a hit unless the function body
+calls ``cache_miss``, which only runs when the cache misses. Spans of the
+current script run are also kept in a thread-local trace for the debug panel.
+
+The text exposition format is served on ``GALLERY_METRICS_PORT`` (``/metrics``)
+and/or rewritten every ``GALLERY_METRICS_INTERVAL`` seconds to
+``GALLERY_METRICS_FILE``, e.g. for node_exporter's textfile collector.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (1 << 10, 4 << 10, 16 << 10, 64 << 10, 256 << 10, 1 << 20, 4 << 20, 16 << 20)
+RECENT_SAMPLES = 512  # per series, for the debug panel's percentiles
+EXPORT_INTERVAL = float(os.environ.get("GALLERY_METRICS_INTERVAL", 15))
+
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label value, plus a window of recent samples"""
+
+    def __init__(self, name, label, buckets, help_text):
+        self.name, self.label, self.buckets, self.help = name, label, buckets, help_text
+        self.series = {}  # label value -> [bucket counts, sum, count, recent samples]
+
+    def observe(self, key, value):
+        with _lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * len(self.buckets), 0.0, 0, deque(maxlen=RECENT_SAMPLES)]
+            position = bisect_left(self.buckets, value)
+            if position < len(self.buckets):
+                series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+            series[3].append(value)
+
+    def summary(self, key):
+        """(count, p50, p95) over the recent samples of one series, or None"""
+        with _lock:
+            series = self.series.get(key)
+            samples = sorted(series[3]) if series else []
+            count = series[2] if series else 0
+        if not samples:
+            return None
+        return count, samples[len(samples) // 2], samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+    def exposition(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            for key, (counts, total, count, _) in sorted(self.series.items()):
+                cumulative = 0
+                for bound, bucket in zip(self.buckets, counts):
+                    cumulative += bucket
+                    lines.append(f'{self.name}_bucket{{{self.label}="{key}",le="{bound:g}"}} {cumulative}')
+                lines.append(f'{self.name}_bucket{{{self.label}="{key}",le="+Inf"}} {count}')
+                lines.append(f'{self.name}_sum{{{self.label}="{key}"}} {total:.6f}')
+                lines.append(f'{self.name}_count{{{self.label}="{key}"}} {count}')
+        return lines
+
+
+SPANS = Histogram("gallery_span_seconds", "span", SECONDS_BUCKETS, "Duration of instrumented spans")
+PAYLOADS = Histogram("gallery_payload_bytes", "payload", BYTES_BUCKETS, "Size of data sent to the browser")
+_cache_requests = {}  # (cache, "hit" | "miss") -> count
+
+
+def _trace():
+    trace = getattr(_local, "trace", None)
+    if trace is None:
+        trace = _local.trace = []
+    return trace
+
+
+def start_trace():
+    """Start a fresh trace of this thread's spans (one script run)"""
+    _local.trace = []
+
+
+def current_trace():
+    """Spans recorded on this thread since start_trace(), as (name, ms, note) tuples"""
+    return list(_trace())
+
+
+@contextmanager
+def span(name):
+    """Time a block as a span"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        SPANS.observe(name, elapsed)
+        _trace().append((name, elapsed * 1000, ""))
+
+
+def cache_miss():
+    """Mark the innermost cache_lookup as a miss; call from inside the cached function"""
+    _local.miss = True
+
+
+@contextmanager
+def cache_lookup(cache):
+    """Time a call into a cached function and count it as a hit or a miss"""
+    outer = getattr(_local, "miss", False)
+    _local.miss = False
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        result = "miss" if _local.miss else "hit"
+        _local.miss = outer
+        SPANS.observe(cache, elapsed)
+        with _lock:
+            _cache_requests[cache, result] = _cache_requests.get((cache, result), 0) + 1
+        # Hits are too many and too cheap to list one by one
+        if result == "miss" or elapsed > 0.01:
+            _trace().append((cache, elapsed * 1000, result))
+
+
+def counted(cache):
+    """Decorator running every call of a cached function inside cache_lookup(cache)"""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with cache_lookup(cache):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def payload(name, size):
+    """Record the size in bytes of something sent to the browser"""
+    PAYLOADS.observe(name, size)
+    _trace().append((f"{name} payload", None, f"{size:,} bytes"))
+
+
+def cache_ratios():
+    """{cache: (hits, misses)}"""
+    ratios = {}
+    with _lock:
+        for (cache, result), count in _cache_requests.items():
+            hits, misses = ratios.get(cache, (0, 0))
+            ratios[cache] = (hits + count, misses) if result == "hit" else (hits, misses + count)
+    return ratios
+
+
+def span_names():
+    with _lock:
+        return sorted(SPANS.series)
+
+
+def exposition():
+    """All metrics in the Prometheus text exposition format"""
+    lines = SPANS.exposition() + PAYLOADS.exposition()
+    lines += ["# HELP gallery_cache_requests_total Cache lookups by result",
+              "# TYPE gallery_cache_requests_total counter"]
+    with _lock:
+        for (cache, result), count in sorted(_cache_requests.items()):
+            lines.append(f'gallery_cache_requests_total{{cache="{cache}",result="{result}"}} {count}')
+    return "\n".join(lines) + "\n"
+
+
+def write_exposition(path):
+    """Atomically rewrite a textfile-collector file"""
+    # The exporter thread and a rerun can both write; the pid alone is not unique
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(exposition())
+    os.replace(tmp_path, path)
+
+
+_exporters = {}
+
+
+def start_export(port=None, path=None, host="0.0.0.0"):
+    """Start (once per process) the /metrics endpoint and/or the textfile writer"""
+    with _lock:
+        if port and "http" not in _exporters:
+            from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+            class MetricsHandler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split("?", 1)[0] != "/metrics":
+                        self.send_error(404)
+                        return
+                    body = exposition().encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass
+
+            server = ThreadingHTTPServer((host, int(port)), MetricsHandler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+            _exporters["http"] = server
+        if path and "file" not in _exporters:
+            def write_forever():
+                while True:
+                    time.sleep(EXPORT_INTERVAL)
+                    try:
+                        write_exposition(path)
+                    except OSError:
+                        pass
+
+            thread = threading.Thread(target=write_forever, name="metrics-writer", daemon=True)
+            thread.start()
+            _exporters["file"] = thread
@@ -0,0 +1,216 @@
+"""Time-budgeted layout search over a process pool.
+
+The search is simulated annealing on piece positions, scored by
+``layout_cost`` (lower is better):
+
+- overlaps, pieces off the wall and pieces behind the couch are heavy
+  penalties, so the result is a valid layout whenever one is reachable;
+- visual balance: the area-weighted centre of the pieces should sit on the
+  couch centre line and at eye level above the couch;
+- consistent spacing: each piece's gap to its nearest neighbour should be
+  close to the standard gap;
+- coverage: pieces should fill their bounding box rather than straggle.
+
+``optimize`` splits the wall-clock budget into short rounds. In each round
+every worker anneals from the best layout found so far with its own random
+seed; results are yielded as soon as a worker improves on the best, so the
+caller can show progress and stop early.
+"""
+import math
+import multiprocessing
+import os
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from layout import COUCH, GAP, MARGIN, WALL_HEIGHT, WALL_WIDTH, piece_size, salon
+from spatial import SpatialIndex
+
+OVERLAP_WEIGHT = 50.0
+OUT_OF_BOUNDS_WEIGHT = 50.0
+BALANCE_WEIGHT = 4.0
+SPACING_WEIGHT = 1.0
+COVERAGE_WEIGHT = 2.0
+
+ROUND_MS = 100
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _overlap_area(a, b):
+    width = min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0])
+    height = min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1])
+    return width * height if width > 0 and height > 0 else 0
+
+
+def _gap_between(a, b):
+    """Edge-to-edge distance between two rectangles (0 when they touch or overlap)"""
+    dx = max(b[0] - (a[0] + a[2]), a[0] - (b[0] + b[2]), 0)
+    dy = max(b[1] - (a[1] + a[3]), a[1] - (b[1] + b[3]), 0)
+    return math.hypot(dx, dy)
+
+
+def layout_cost(rects, wall_width=WALL_WIDTH, wall_height=WALL_HEIGHT, couch=COUCH, gap=GAP):
+    """Cost of a list of (x, y, w, h) rectangles; lower is better"""
+    if not rects:
+        return 0.0
+    index = SpatialIndex()
+    for i, rect in enumerate(rects):
+        index.insert(i, rect)
+
+    wall_area = float(wall_width * wall_height)
+    penalty = 0.0
+    spacing = 0.0
+    total_area = 0.0
+    cx = cy = 0.0
+    for i, rect in enumerate(rects):
+        x, y, w, h = rect
+        area = w * h
+        total_area += area
+        cx += (x + w / 2) * area
+        cy += (y + h / 2) * area
+
+        inside_w = max(0, min(x + w, wall_width - MARGIN) - max(x, MARGIN))
+        inside_h = max(0, min(y + h, wall_height - MARGIN) - max(y, MARGIN))
+        penalty += OUT_OF_BOUNDS_WEIGHT * (area - inside_w * inside_h) / wall_area
+        penalty += OVERLAP_WEIGHT * _overlap_area(rect, couch) / wall_area
+
+        nearest = 3 * gap
+        for j in index.near(rect, 3 * gap, exclude=i):
+            other = rects[j]
+            if j > i:
+                penalty += OVERLAP_WEIGHT * _overlap_area(rect, other) / wall_area
+            nearest = min(nearest, _gap_between(rect, other))
+        if len(rects) > 1:
+            spacing += ((nearest - gap) / gap) ** 2
+
+    cx /= total_area
+    cy /= total_area
+    eyeline = (MARGIN + couch[1]) / 2
+    balance = abs(cx - (couch[0] + couch[2] / 2)) / wall_width + abs(cy - eyeline) / wall_height
+
+    left = min(r[0] for r in rects)
+    top = min(r[1] for r in rects)
+    right = max(r[0] + r[2] for r in rects)
+    bottom = max(r[1] + r[3] for r in rects)
+    coverage = total_area / max(1.0, (right - left) * (bottom - top))
+
+    return (penalty + BALANCE_WEIGHT * balance + SPACING_WEIGHT * spacing / len(rects)
+            + COVERAGE_WEIGHT * (1 - coverage))
+
+
+def anneal(sizes, start, deadline, seed, wall_width=WALL_WIDTH, wall_height=WALL_HEIGHT, couch=COUCH, gap=GAP):
+    """Simulated annealing from start positions until the deadline (time.time())
+
+    sizes and start are parallel lists of (w, h) and (x, y). Returns
+    (best cost, best positions).
+    """
+    rng = random.Random(seed)
+    positions = [tuple(p) for p in start]
+    n = len(positions)
+
+    def cost_of(candidate):
+        return layout_cost([(x, y, w, h) for (x, y), (w, h) in zip(candidate, sizes)],
+                           wall_width, wall_height, couch, gap)
+
+    cost = cost_of(positions)
+    best_cost, best = cost, list(positions)
+    if n == 0:
+        return best_cost, best
+
+    began = time.time()
+    span = max(1e-3, deadline - began)
+    temperature0 = 0.05
+    while True:
+        now = time.time()
+        if now >= deadline:
+            break
+        # Cool linearly in time, so every budget ends in a greedy phase
+        progress = (now - began) / span
+        temperature = temperature0 * (1 - progress) + 1e-6
+        step = max(2.0, 0.25 * min(wall_width, wall_height) * (1 - progress))
+
+        candidate = list(positions)
+        i = rng.randrange(n)
+        if n > 1 and rng.random() < 0.2:
+            # Swap two pieces around their centres
+            j = rng.randrange(n)
+            (xi, yi), (wi, hi) = candidate[i], sizes[i]
+            (xj, yj), (wj, hj) = candidate[j], sizes[j]
+            candidate[i] = (round(xj + (wj - wi) / 2), round(yj + (hj - hi) / 2))
+            candidate[j] = (round(xi + (wi - wj) / 2), round(yi + (hi - hj) / 2))
+        else:
+            x, y = candidate[i]
+            candidate[i] = (round(x + rng.gauss(0, step)), round(y + rng.gauss(0, step)))
+
+        new_cost = cost_of(candidate)
+        if new_cost <= cost or rng.random() < math.exp((cost - new_cost) / temperature):
+            positions, cost = candidate, new_cost
+            if cost < best_cost:
+                best_cost, best = cost, list(positions)
+    return best_cost, best
+
+
+def _anneal_task(args):
+    return anneal(*args)
+
+
+def get_pool(workers=None):
+    """Process pool shared by all optimizations in this process
+
+    Uses the spawn start method: the Streamlit server is multi-threaded and
+    forking it is not safe.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None:
+            _pool_workers = workers or os.cpu_count() or 1
+            _pool = ProcessPoolExecutor(
+                max_workers=_pool_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool, _pool_workers
+
+
+def optimize(artworks, budget_ms=500, workers=None, seed=None, wall_width=WALL_WIDTH,
+             wall_height=WALL_HEIGHT, couch=COUCH, gap=GAP):
+    """Search for a better arrangement of artworks within budget_ms of wall-clock time
+
+    Yields (cost, placements) every time the best layout improves, where
+    placements maps artwork id -> (x, y). The first value is the starting
+    layout: whichever of the current wall_x/wall_y positions and a salon
+    arrangement scores better.
+    """
+    deadline = time.time() + budget_ms / 1000
+    ids = [artwork["id"] for artwork in artworks]
+    sizes = [piece_size(artwork) for artwork in artworks]
+    rng = random.Random(seed)
+
+    current = [(artwork.get("wall_x", 0), artwork.get("wall_y", 0)) for artwork in artworks]
+    start_layout = salon(artworks, wall_width, wall_height, (couch,), gap)
+    seeded = [start_layout.placements.get(key, pos) for key, pos in zip(ids, current)]
+    wall = (wall_width, wall_height, couch, gap)
+    candidates = [
+        (layout_cost([(x, y, w, h) for (x, y), (w, h) in zip(p, sizes)], *wall), p)
+        for p in (current, seeded)
+    ]
+    best_cost, best = min(candidates, key=lambda c: c[0])
+    yield best_cost, dict(zip(ids, best))
+    if not artworks:
+        return
+
+    pool, worker_count = get_pool(workers)
+    while time.time() < deadline - 0.01:
+        round_deadline = min(deadline, time.time() + ROUND_MS / 1000)
+        futures = [
+            pool.submit(_anneal_task, (sizes, best, round_deadline, rng.randrange(1 << 30), *wall))
+            for _ in range(worker_count)
+        ]
+        for future in as_completed(futures):
+            cost, positions = future.result()
+            if cost < best_cost:
+                best_cost, best = cost, positions
+                yield best_cost, dict(zip(ids, best))
@@ -0,0 +1,191 @@
+"""Server-side rendering of a gallery wall to PNG/WebP with Pillow.
+
+The wall is composited like the component draws it: the wall gradient, each
+framed artwork at its ``wall_x``/``wall_y`` in list order, then the couch on
+top. ``scale`` multiplies the canvas (900x500 unless a wall size is given), so
+any output resolution uses the same layout.
+
+Framed, scaled artwork tiles are cached by (image hash, size, frame), so
+repeated renders of similar designs only decode and resample each image once.
+Given an asset manifest, tiles take the resolved path and hash from it and no
+file is touched until a tile has to be drawn; without one, each image is
+resolved and stat'ed per render.
+``WallRenderer`` keeps the last canvas it produced. When only some pieces
+changed, it redraws just the union of their old and new rectangles and finds
+the pieces to repaint there with the spatial index.
+"""
+import io
+import os
+from functools import lru_cache
+
+from layout import SCALE, WALL_HEIGHT, WALL_WIDTH, couch_rect, rects_overlap
+from manifest import resolve_path
+from spatial import SpatialIndex, placed_rect
+from thumbnails import file_hash
+
+COUCH_IMAGE = "couch.webp"
+WALL_COLORS = ((0xBD, 0xC3, 0xC7), (0x2C, 0x3E, 0x50))
+FRAME_COLOR = (0x65, 0x43, 0x21)
+PLACEHOLDER_COLOR = (0x9E, 0x9E, 0x9E)
+FRAME_PX_PER_UNIT = 3  # the component draws frame_width * 3 px borders
+TILE_CACHE_SIZE = 512
+
+
+@lru_cache(maxsize=1024)
+def _image_digest(path, mtime_ns, size):
+    return file_hash(path)
+
+
+def image_digest(path):
+    """Content hash of an image, recomputed only when the file changes; None if missing"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return _image_digest(path, stat.st_mtime_ns, stat.st_size)
+
+
+@lru_cache(maxsize=8)
+def wall_background(width, height):
+    """Diagonal wall gradient, as in the component's CSS"""
+    from PIL import Image
+
+    # A 2x2 image resized with bilinear filtering gives a smooth diagonal blend
+    (r0, g0, b0), (r1, g1, b1) = WALL_COLORS
+    mid = ((r0 + r1) // 2, (g0 + g1) // 2, (b0 + b1) // 2)
+    corners = Image.new("RGB", (2, 2))
+    corners.putdata([WALL_COLORS[0], mid, mid, WALL_COLORS[1]])
+    return corners.resize((width, height), Image.BILINEAR)
+
+
+@lru_cache(maxsize=8)
+def couch_tile(width, height):
+    """Couch image fitted inside its box, or None when the image is missing"""
+    from PIL import Image, ImageOps
+
+    if not os.path.exists(COUCH_IMAGE):
+        return None
+    with Image.open(COUCH_IMAGE) as img:
+        return ImageOps.contain(img.convert("RGBA"), (width, height), Image.LANCZOS)
+
+
+@lru_cache(maxsize=TILE_CACHE_SIZE)
+def _artwork_tile(digest, path, size, frame):
+    from PIL import Image, ImageOps
+
+    width, height = size
+    tile = Image.new("RGB", size, FRAME_COLOR)
+    inner = (max(1, width - 2 * frame), max(1, height - 2 * frame))
+    if digest is None:
+        tile.paste(PLACEHOLDER_COLOR, (frame, frame, frame + inner[0], frame + inner[1]))
+        return tile
+    with Image.open(path) as img:
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        tile.paste(ImageOps.fit(img, inner, Image.LANCZOS), (frame, frame))
+    return tile
+
+
+def artwork_tile(artwork, scale=1.0, manifest=None):
+    """Framed artwork image at its size on a canvas scaled by scale
+
+    With a manifest the image is looked up in it; otherwise it is resolved and
+    hashed from the disk.
+    """
+    width, height = max(1, round(artwork["width"] * SCALE * scale)), max(1, round(artwork["height"] * SCALE * scale))
+    frame = round(artwork.get("frame_width", 0) * FRAME_PX_PER_UNIT * scale)
+    if manifest is not None:
+        entry = manifest.get(artwork.get("image_path", ""))
+        digest, path = (entry.sha256, entry.resolved) if entry else (None, "")
+    else:
+        # Catalog paths may differ from the files on disk in case
+        path = resolve_path(artwork.get("image_path", "")) or ""
+        digest = image_digest(path)
+    return _artwork_tile(digest, path, (width, height), frame)
+
+
+def _scaled(rect, scale):
+    x, y, w, h = rect
+    return round(x * scale), round(y * scale), round(w * scale), round(h * scale)
+
+
+class WallRenderer:
+    """Renders walls at one scale, redrawing only the regions that changed since the last render"""
+
+    def __init__(self, scale=1.0, wall_width=WALL_WIDTH, wall_height=WALL_HEIGHT, manifest=None):
+        self.scale = scale
+        self.manifest = manifest
+        self.wall = (wall_width, wall_height)
+        self.couch = couch_rect(wall_width, wall_height)
+        self.size = (round(wall_width * scale), round(wall_height * scale))
+        self.canvas = None
+        self.pieces = {}  # artwork id -> (rect, tile key) of the last render
+        self.order = []
+        self.position = {}
+
+    def _piece_state(self, artwork):
+        rect = placed_rect(artwork)
+        return rect, (artwork.get("image_path"), artwork["width"], artwork["height"], artwork.get("frame_width", 0))
+
+    def _draw_region(self, region, artworks, index):
+        """Redraw one canvas-unit rectangle from the background up"""
+        left, top, width, height = _scaled(region, self.scale)
+        left, top = max(0, left), max(0, top)
+        right = min(self.size[0], left + width + 1)
+        bottom = min(self.size[1], top + height + 1)
+        if right <= left or bottom <= top:
+            return
+        patch = wall_background(*self.size).crop((left, top, right, bottom))
+        # Pieces just touching the region can still share its edge pixels
+        x, y, w, h = region
+        reach = (x - 1, y - 1, w + 2, h + 2)
+        for key in sorted(index.query(reach), key=self.position.__getitem__):
+            x, y, _, _ = _scaled(index.rects[key], self.scale)
+            patch.paste(artwork_tile(artworks[key], self.scale, self.manifest), (x - left, y - top))
+        couch_x, couch_y, couch_w, couch_h = _scaled(self.couch, self.scale)
+        couch = couch_tile(couch_w, couch_h)
+        if couch is not None and rects_overlap(reach, self.couch):
+            # Centred in its box like object-fit: contain
+            offset = (couch_x + (couch_w - couch.width) // 2 - left, couch_y + (couch_h - couch.height) // 2 - top)
+            patch.paste(couch, offset, couch)
+        self.canvas.paste(patch, (left, top))
+
+    def render(self, artworks):
+        """Render a list of placed artworks and return the canvas (a PIL image)"""
+        by_id = {artwork["id"]: artwork for artwork in artworks}
+        pieces = {key: self._piece_state(artwork) for key, artwork in by_id.items()}
+        order = [artwork["id"] for artwork in artworks]
+
+        kept_before = [key for key in self.order if key in by_id]
+        kept_now = [key for key in order if key in self.pieces]
+        if self.canvas is None or kept_before != kept_now:
+            # First render, or pieces changed stacking order: draw everything
+            dirty = [(0, 0, *self.wall)]
+            self.canvas = wall_background(*self.size).copy()
+        else:
+            dirty = []
+            for key in set(self.pieces) | set(pieces):
+                old, new = self.pieces.get(key), pieces.get(key)
+                if old != new:
+                    dirty.extend(state[0] for state in (old, new) if state is not None)
+
+        self.pieces, self.order = pieces, order
+        self.position = {key: i for i, key in enumerate(order)}
+        if dirty:
+            index = SpatialIndex()
+            for key, (rect, _) in pieces.items():
+                index.insert(key, rect)
+            for region in dirty:
+                self._draw_region(region, by_id, index)
+        return self.canvas
+
+    def render_bytes(self, artworks, fmt="PNG"):
+        """Render and encode as PNG or WEBP"""
+        out = io.BytesIO()
+        options = {"quality": 85} if fmt == "WEBP" else {}
+        self.render(artworks).save(out, fmt, **options)
+        return out.getvalue()
+
+
+def render_wall(artworks, scale=1.0, fmt="PNG", wall_width=WALL_WIDTH, wall_height=WALL_HEIGHT, manifest=None):
+    """One-off render of a wall, encoded as PNG or WEBP bytes"""
+    return WallRenderer(scale, wall_width, wall_height, manifest).render_bytes(artworks, fmt)
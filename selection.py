@@ -0,0 +1,126 @@
+"""Budget-constrained artwork selection: "fill this wall for under $1,500".
+
+``select_artworks`` is a branch-and-bound search over the catalog. It
+maximises the wall area covered, subject to a price budget, the usable wall
+area and optional style-diversity limits. Candidates are sorted by area per
+dollar. The bound at each node is the fractional (LP) relaxation over that
+order, found with one binary search over prefix sums, and capped at the
+remaining wall area. The search dives greedily first, so good selections turn
+up early. Whole subtrees are pruned once they cannot beat the k-th best
+selection found so far by more than a small tolerance. A time limit makes the
+search anytime on very large catalogs: it returns the best selections found
+within the limit.
+"""
+import heapq
+import time
+from bisect import bisect_right
+from collections import namedtuple
+from itertools import accumulate
+
+from layout import COUCH, MARGIN, WALL_HEIGHT, WALL_WIDTH, piece_size
+
+# Share of the free wall that pieces can cover once gaps are left between them
+FILL_RATIO = 0.45
+TIME_LIMIT = 0.5
+# Subtrees that cannot beat the k-th best by more than this fraction are pruned
+TOLERANCE = 0.005
+
+Selection = namedtuple("Selection", ["artworks", "price", "area"])
+Selection.__doc__ = "artworks is a list of catalog dicts; area is in canvas pixels squared"
+
+
+def wall_capacity(wall_width=WALL_WIDTH, wall_height=WALL_HEIGHT, obstacles=(COUCH,), margin=MARGIN,
+                  fill=FILL_RATIO):
+    """Canvas area that a selection may cover and still hang with gaps"""
+    free = (wall_width - 2 * margin) * (wall_height - 2 * margin)
+    free -= sum(w * h for _, _, w, h in obstacles)
+    return max(0, free * fill)
+
+
+def select_artworks(artworks, budget, k=3, max_area=None, max_per_style=None, min_styles=0,
+                    time_limit=TIME_LIMIT, tolerance=TOLERANCE, wall_width=WALL_WIDTH, wall_height=WALL_HEIGHT):
+    """Top-k selections of artworks costing at most budget, largest wall coverage first
+
+    max_area defaults to ``wall_capacity()``. max_per_style caps the pieces
+    taken from any one style and min_styles asks for at least that many
+    different styles. Ties on area are ordered by price. With a non-zero
+    tolerance the result is within that fraction of the true top-k, which
+    lets the search finish early on large catalogs. Returns a list of at
+    most k Selections.
+    """
+    if max_area is None:
+        max_area = wall_capacity(wall_width, wall_height)
+    inner_width, inner_height = wall_width - 2 * MARGIN, wall_height - 2 * MARGIN
+
+    items = []
+    for artwork in artworks:
+        width, height = piece_size(artwork)
+        area = width * height
+        price = artwork.get("price", 0)
+        if price <= budget and area <= max_area and width <= inner_width and height <= inner_height:
+            items.append((area, price, artwork))
+    # Most area per dollar first; free pieces lead
+    items.sort(key=lambda item: (-item[0] / item[1] if item[1] > 0 else -float("inf"), item[1]))
+    areas = [item[0] for item in items]
+    prices = [item[1] for item in items]
+    styles = [item[2].get("style") for item in items]
+    area_sums = [0, *accumulate(areas)]
+    price_sums = [0, *accumulate(prices)]
+    n = len(items)
+
+    # Styles still available from position i onwards, for the min_styles bound
+    suffix_styles = [frozenset()] * (n + 1)
+    if min_styles:
+        for i in range(n - 1, -1, -1):
+            suffix_styles[i] = suffix_styles[i + 1] | {styles[i]}
+
+    def bound(i, budget_left, area):
+        """Best area reachable from position i, taking pieces fractionally"""
+        stop = bisect_right(price_sums, price_sums[i] + budget_left, lo=i) - 1
+        total = area + area_sums[stop] - area_sums[i]
+        if stop < n:
+            spent = price_sums[stop] - price_sums[i]
+            total += areas[stop] * (budget_left - spent) / prices[stop] if prices[stop] else areas[stop]
+        return min(total, max_area)
+
+    best = []  # min-heap of (area, -price, sequence, chosen positions)
+    sequence = 0
+    deadline = time.perf_counter() + time_limit
+    # Each node is (next position, budget left, area so far, chosen positions, style counts)
+    stack = [(0, budget, 0, (), {})]
+    nodes = 0
+    while stack:
+        nodes += 1
+        if nodes % 1024 == 0 and time.perf_counter() > deadline:
+            break
+        i, budget_left, area, chosen, counts = stack.pop()
+        if i >= n:
+            continue
+        if len(best) == k and bound(i, budget_left, area) <= best[0][0] * (1 + tolerance):
+            continue
+        if min_styles and len(counts) + len(suffix_styles[i] - counts.keys()) < min_styles:
+            continue
+
+        # Exclude position i (explored second)
+        stack.append((i + 1, budget_left, area, chosen, counts))
+
+        # Include position i (explored first)
+        style = styles[i]
+        if (prices[i] <= budget_left and area + areas[i] <= max_area
+                and (max_per_style is None or counts.get(style, 0) < max_per_style)):
+            included = (i + 1, budget_left - prices[i], area + areas[i], chosen + (i,),
+                        {**counts, style: counts.get(style, 0) + 1})
+            stack.append(included)
+            # Every include creates a new selection; record it if it qualifies
+            if len(included[4]) >= min_styles:
+                entry = (included[2], -(budget - included[1]), sequence, included[3])
+                sequence += 1
+                if len(best) < k:
+                    heapq.heappush(best, entry)
+                elif entry[:2] > best[0][:2]:
+                    heapq.heapreplace(best, entry)
+
+    return [
+        Selection([items[p][2] for p in chosen], -negative_price, area)
+        for area, negative_price, _, chosen in sorted(best, reverse=True)
+    ]
@@ -0,0 +1,199 @@
+"""Spatial index over placed artworks: overlap queries, snapping and layout validation.
+
+``SpatialIndex`` is a uniform grid hash: each rectangle is registered in the
+cells it touches, so an overlap query only looks at pieces sharing a cell
+with the query rectangle. With cells about the size of a typical piece that
+is a handful of candidates per query, independent of how many pieces hang
+on the wall, which keeps validation of large walls close to linear instead
+of comparing every pair.
+"""
+from collections import defaultdict
+
+from layout import COUCH, GAP, MARGIN, WALL_HEIGHT, WALL_WIDTH, piece_size, rects_overlap
+
+CELL_SIZE = 128
+SNAP_DISTANCE = 12
+
+
+class SpatialIndex:
+    """Uniform grid hash of (x, y, w, h) rectangles keyed by artwork id"""
+
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = defaultdict(set)
+        self.rects = {}
+
+    def __len__(self):
+        return len(self.rects)
+
+    def _cells(self, rect):
+        x, y, w, h = rect
+        size = self.cell_size
+        for cx in range(int(x // size), int((x + max(w, 1) - 1e-9) // size) + 1):
+            for cy in range(int(y // size), int((y + max(h, 1) - 1e-9) // size) + 1):
+                yield cx, cy
+
+    def insert(self, key, rect):
+        if key in self.rects:
+            self.remove(key)
+        self.rects[key] = rect
+        for cell in self._cells(rect):
+            self.cells[cell].add(key)
+
+    def remove(self, key):
+        rect = self.rects.pop(key, None)
+        if rect is None:
+            return
+        for cell in self._cells(rect):
+            bucket = self.cells[cell]
+            bucket.discard(key)
+            if not bucket:
+                del self.cells[cell]
+
+    def candidates(self, rect):
+        """Keys sharing at least one grid cell with rect"""
+        found = set()
+        for cell in self._cells(rect):
+            found.update(self.cells.get(cell, ()))
+        return found
+
+    def query(self, rect, exclude=None):
+        """Keys whose rectangles overlap rect"""
+        return {
+            key for key in self.candidates(rect)
+            if key != exclude and rects_overlap(rect, self.rects[key])
+        }
+
+    def near(self, rect, distance, exclude=None):
+        """Keys whose rectangles come within distance of rect"""
+        x, y, w, h = rect
+        return self.query((x - distance, y - distance, w + 2 * distance, h + 2 * distance), exclude)
+
+
+def placed_rect(artwork):
+    """Canvas rectangle of an artwork placed at its wall_x/wall_y"""
+    width, height = piece_size(artwork)
+    return artwork.get("wall_x", 0), artwork.get("wall_y", 0), width, height
+
+
+def build_index(artworks, cell_size=CELL_SIZE):
+    """SpatialIndex over placed artworks"""
+    index = SpatialIndex(cell_size)
+    for artwork in artworks:
+        index.insert(artwork["id"], placed_rect(artwork))
+    return index
+
+
+def find_free_spot(artworks, piece, wall_width=WALL_WIDTH, wall_height=WALL_HEIGHT, obstacles=(COUCH,),
+                   gap=GAP, margin=MARGIN):
+    """Top-most, then left-most (x, y) where piece hangs a gap away from everything; None if full"""
+    width, height = piece_size(piece)
+    index = build_index(artworks)
+    blocked = [(x - gap, y - gap, w + 2 * gap, h + 2 * gap) for x, y, w, h in obstacles]
+    for y in range(margin, wall_height - margin - height + 1, gap):
+        for x in range(margin, wall_width - margin - width + 1, gap):
+            rect = (x, y, width, height)
+            if not any(rects_overlap(rect, b) for b in blocked) and not index.near(rect, gap):
+                return x, y
+    return None
+
+
+def validate_layout(artworks, wall_width=WALL_WIDTH, wall_height=WALL_HEIGHT, obstacles=(COUCH,)):
+    """Problems with a placed layout, as a list of dicts
+
+    Each problem has a ``type`` of ``"overlap"`` (with the two ``ids``),
+    ``"out_of_bounds"`` or ``"obstacle"`` (with the piece ``id``). An empty
+    list means the layout is clean.
+    """
+    index = build_index(artworks)
+    problems = []
+    for artwork in artworks:
+        key = artwork["id"]
+        rect = index.rects[key]
+        x, y, w, h = rect
+        if x < 0 or y < 0 or x + w > wall_width or y + h > wall_height:
+            problems.append({"type": "out_of_bounds", "id": key})
+        if any(rects_overlap(rect, obstacle) for obstacle in obstacles):
+            problems.append({"type": "obstacle", "id": key})
+        for other in index.query(rect, exclude=key):
+            # Report each pair once
+            if str(key) < str(other):
+                problems.append({"type": "overlap", "ids": (key, other)})
+    return problems
+
+
+def _snap_axis(start, length, others, gap, distance):
+    """Best snapped start on one axis, given neighbours as (start, length) pairs"""
+    best, best_offset = start, distance + 1
+    for other_start, other_length in others:
+        other_end = other_start + other_length
+        targets = (
+            other_start,                                 # align leading edges
+            other_end - length,                          # align trailing edges
+            other_start + (other_length - length) / 2,   # align centres
+            other_end + gap,                             # consistent gap after
+            other_start - gap - length,                  # consistent gap before
+        )
+        for target in targets:
+            offset = abs(target - start)
+            if offset < best_offset:
+                best, best_offset = target, offset
+    return round(best) if best_offset <= distance else start
+
+
+def snap(index, key, rect, gap=GAP, distance=SNAP_DISTANCE):
+    """Snap rect (for piece key) to aligned edges and consistent gaps of nearby pieces
+
+    Returns the snapped (x, y). Each axis snaps independently, and only to
+    neighbours within reach of the gap, so distant pieces have no effect.
+    """
+    x, y, w, h = rect
+    neighbours = [index.rects[other] for other in index.near(rect, gap + distance, exclude=key)]
+    new_x = _snap_axis(x, w, [(r[0], r[2]) for r in neighbours], gap, distance)
+    new_y = _snap_axis(y, h, [(r[1], r[3]) for r in neighbours], gap, distance)
+    # Never snap into an overlap
+    if index.query((new_x, new_y, w, h), exclude=key):
+        return x, y
+    return new_x, new_y
+
+
+def _fits(rect, wall_width, wall_height, obstacles):
+    """Whether a rectangle lies on the wall and clear of every obstacle"""
+    x, y, w, h = rect
+    return (x >= 0 and y >= 0 and x + w <= wall_width and y + h <= wall_height
+            and not any(rects_overlap(rect, obstacle) for obstacle in obstacles))
+
+
+def snap_layout(artworks, gap=GAP, distance=SNAP_DISTANCE, margin=MARGIN, wall_width=WALL_WIDTH,
+                wall_height=WALL_HEIGHT, obstacles=(COUCH,)):
+    """Snap every placed artwork in turn; updates wall_x/wall_y in place and returns the count moved
+
+    A piece only moves to a spot that is on the wall, clear of the obstacles
+    and of every other piece, so snapping never adds a validate_layout problem.
+    """
+    index = build_index(artworks)
+    moved = 0
+    for artwork in artworks:
+        key = artwork["id"]
+        x, y = snap(index, key, index.rects[key], gap, distance)
+        x, y = max(margin, x), max(margin, y)
+        rect = (x, y) + index.rects[key][2:]
+        if ((x, y) != (artwork.get("wall_x", 0), artwork.get("wall_y", 0))
+                and _fits(rect, wall_width, wall_height, obstacles) and not index.query(rect, exclude=key)):
+            artwork["wall_x"], artwork["wall_y"] = x, y
+            index.insert(key, rect)
+            moved += 1
+    return moved
+
+
+def describe_problems(problems):
+    """Short human-readable summary of validate_layout problems"""
+    labels = {
+        "overlap": "overlapping pair(s)",
+        "out_of_bounds": "piece(s) off the wall",
+        "obstacle": "piece(s) behind the couch",
+    }
+    counts = {}
+    for problem in problems:
+        counts[problem["type"]] = counts.get(problem["type"], 0) + 1
+    return ", ".join(f"{count} {labels[kind]}" for kind, count in counts.items())
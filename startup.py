@@ -0,0 +1,238 @@
+"""Precomputed startup artifacts and the cold-start import budget.
+
+    python -m gallery_wall_designer build [--storage URL] [--workers N] [--base-url URL]
+    python -m gallery_wall_designer build --profile
+
+A cold server otherwise does all of its image work in the first session: it
+hashes every catalog image, generates its thumbnails, publishes them as assets
+and builds the palette state. The build step does that ahead of time (e.g.
+while building the container image) and records the asset names in
+``STARTUP_SNAPSHOT``. The app trusts a snapshot entry while the source file's
+size and mtime still match and its asset is present, and falls back to the
+on-demand path for anything else. The build also brings the colour features
+(``features.py``) up to date. Rebuild after changing the catalog or its
+images. The component page itself is already a static file served by
+Streamlit, so it needs no build.
+
+``--profile`` imports the app's own modules in a fresh interpreter after
+Streamlit and fails when they take longer than ``IMPORT_BUDGET_MS``. Heavy or
+optional dependencies (Pillow, SQLite, the optimizer's process pool, the
+renderer) are imported where they are first used.
+"""
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from assets import ASSET_DIR, ASSET_URL, asset_url, local_server_url, publish_asset, publish_catalog_state
+from storage import get_storage
+from manifest import build_manifest
+from thumbnails import VARIANTS, build_thumbnail
+
+STARTUP_SNAPSHOT = os.environ.get("GALLERY_STARTUP_SNAPSHOT", "startup_snapshot.json")
+IMPORT_BUDGET_MS = int(os.environ.get("GALLERY_IMPORT_BUDGET_MS", 25))
+COUCH_IMAGE = "couch.webp"
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gallery_wall_designer.py")
+
+
+@lru_cache(maxsize=1)
+def load_snapshot(path=STARTUP_SNAPSHOT):
+    """The startup snapshot written by the build step, or an empty one"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"files": {}, "catalog_states": {}}
+
+
+def _asset_exists(name):
+    return os.path.exists(os.path.join(ASSET_DIR, name))
+
+
+def snapshot_asset(path, variant=None, asset=None):
+    """Asset name of a file (or of one of its thumbnail variants) from the snapshot, if still current
+
+    asset is the file's manifest AssetEntry when the caller has one; it
+    replaces a stat of the file.
+    """
+    entry = load_snapshot()["files"].get(path)
+    if entry is None:
+        return None
+    if asset is None:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        current = (stat.st_size, stat.st_mtime_ns)
+    else:
+        current = (asset.size, asset.mtime_ns)
+    if current != (entry["size"], entry["mtime_ns"]):
+        return None
+    name = entry["asset"] if variant is None else entry["thumbnails"].get(variant)
+    return name if name and _asset_exists(name) else None
+
+
+def palette_hash(artworks):
+    """Content hash of the artworks in a palette"""
+    return hashlib.sha1(json.dumps(artworks, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def catalog_state_key(digest, base_url):
+    """Snapshot key of a published palette state"""
+    return f"{digest}@{base_url}"
+
+
+def snapshot_catalog_state(artworks, base_url):
+    """Asset name of a prebuilt palette state for these artworks and asset URL, if any"""
+    name = load_snapshot()["catalog_states"].get(catalog_state_key(palette_hash(artworks), base_url))
+    return name if name and _asset_exists(name) else None
+
+
+def _prepare_file(asset, variants):
+    """Publish a manifest entry's file and its thumbnail variants; returns its snapshot entry"""
+    thumbnails = {}
+    for variant in variants:
+        try:
+            thumbnail = build_thumbnail(asset.resolved, variant, asset.sha256)
+        except (ImportError, OSError):
+            # The app falls back to the original file in the same way
+            thumbnail = asset.resolved
+        thumbnails[variant] = publish_asset(thumbnail)
+    return {"size": asset.size, "mtime_ns": asset.mtime_ns, "asset": publish_asset(asset.resolved, asset.sha256),
+            "thumbnails": thumbnails}
+
+
+def build_snapshot(artworks, base_url=ASSET_URL, workers=None, path=STARTUP_SNAPSHOT):
+    """Precompute thumbnails, assets and the unfiltered palette state; returns the snapshot"""
+    manifest = build_manifest([artwork["image_path"] for artwork in artworks] + [COUCH_IMAGE], workers=workers)
+    assets = [manifest.get(image_path) for image_path in sorted(manifest.entries) if image_path != COUCH_IMAGE]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        entries = pool.map(_prepare_file, assets, [tuple(VARIANTS)] * len(assets))
+        files = {asset.path: entry for asset, entry in zip(assets, entries)}
+    couch = _prepare_file(manifest.get(COUCH_IMAGE), ()) if manifest.get(COUCH_IMAGE) else None
+    if couch is not None:
+        files[COUCH_IMAGE] = couch
+
+    images = {
+        image_path: {variant: asset_url(name, base_url) for variant, name in entry["thumbnails"].items()}
+        for image_path, entry in files.items()
+        if image_path != COUCH_IMAGE
+    }
+    couch_url = asset_url(couch["asset"], base_url) if couch else None
+    state = publish_catalog_state(artworks, images, couch_url, base_url)
+    snapshot = {
+        "created": time.time(),
+        "files": files,
+        "catalog_states": {catalog_state_key(palette_hash(artworks), base_url): state},
+    }
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, path)
+    load_snapshot.cache_clear()
+    return snapshot
+
+
+def app_modules(script=APP_SCRIPT):
+    """Project modules the app imports at the top level"""
+    root = os.path.dirname(script)
+    with open(script) as f:
+        tree = ast.parse(f.read())
+    names = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.append(node.module)
+    return [name for name in dict.fromkeys(names) if os.path.exists(os.path.join(root, f"{name}.py"))]
+
+
+def profile_imports(modules=None):
+    """Import times in ms of the app's modules after Streamlit, in a fresh interpreter
+
+    Returns (Streamlit's import time, {module: cumulative import time}). A
+    module's cumulative time includes the project modules it imports, so only
+    project modules that no other project module imported are listed, and
+    the times add up to the total without counting anything twice.
+    """
+    modules = modules or app_modules()
+    root = os.path.dirname(APP_SCRIPT)
+    code = "import streamlit, streamlit.components.v1\n" + "".join(f"import {name}\n" for name in modules)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=root,
+                            capture_output=True, text=True, check=True)
+    lines = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            # Nesting is shown by two spaces of indent per level
+            depth = (len(name) - len(name.lstrip())) // 2
+            lines.append((depth, name.strip(), int(cumulative) / 1000))
+
+    # -X importtime lists a module after the modules it imported, so walk the
+    # lines backwards to see every module before its imports
+    times = {}
+    streamlit_ms = 0.0
+    stack = []  # (depth, whether a project module is this line or one of its importers)
+    for depth, name, ms in reversed(lines):
+        while stack and stack[-1][0] >= depth:
+            stack.pop()
+        inside_project = bool(stack) and stack[-1][1]
+        is_project = os.path.exists(os.path.join(root, f"{name}.py"))
+        if is_project and not inside_project:
+            times[name] = ms
+        if name == "streamlit" and depth == 0:
+            streamlit_ms = ms
+        stack.append((depth, inside_project or is_project))
+    return streamlit_ms, times
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m gallery_wall_designer build",
+                                     description="Precompute startup artifacts, or check the import-time budget")
+    parser.add_argument("--storage", help="storage URL (default: GALLERY_STORAGE or artwork_database.json)")
+    parser.add_argument("--workers", type=int, help="threads hashing and resizing images (default: automatic)")
+    parser.add_argument("--base-url", help="asset base URL the app serves assets from (default: as the app picks it)")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"only check that app imports stay within {IMPORT_BUDGET_MS} ms after Streamlit")
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        streamlit_ms, times = profile_imports()
+        total = sum(times.values())
+        for name, ms in sorted(times.items(), key=lambda item: -item[1]):
+            print(f"{ms:8.1f} ms  {name}")
+        print(f"{total:.1f} ms for app modules (budget {IMPORT_BUDGET_MS} ms), {streamlit_ms:.1f} ms for Streamlit")
+        return 0 if total <= IMPORT_BUDGET_MS else 1
+
+    base_url = args.base_url or ASSET_URL
+    port = os.environ.get("GALLERY_ASSET_PORT")
+    if not args.base_url and port:
+        # As get_asset_base_url() in the app
+        base_url = os.environ.get("GALLERY_ASSET_URL") or local_server_url(port)
+    started = time.time()
+    artworks = get_storage(args.storage).load_artworks()
+    snapshot = build_snapshot(artworks, base_url, args.workers)
+    missing = len({artwork["image_path"] for artwork in artworks} - set(snapshot["files"]))
+    print(f"Prepared {len(snapshot['files'])} images for {len(artworks)} artworks in {time.time() - started:.1f}s "
+          f"({missing} image paths missing) -> {STARTUP_SNAPSHOT}", file=sys.stderr)
+
+    from features import FEATURES_PATH, update_features
+
+    started = time.time()
+    manifest = build_manifest([artwork["image_path"] for artwork in artworks], workers=args.workers)
+    store = update_features(manifest, workers=args.workers)
+    print(f"Colour features for {len(store)} images in {time.time() - started:.1f}s -> {FEATURES_PATH}",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,526 @@
+"""Pluggable storage for the artwork catalog and saved gallery designs.
+
+Two backends share one interface:
+
+- ``JsonStorage`` keeps a JSON snapshot in the original
+  ``artwork_database.json`` format plus an append-only journal of saved
+  designs, and suits small installs.
+- ``SqliteStorage`` keeps artworks and designs in indexed tables, writes each
+  design in its own transaction and runs in WAL mode so readers never block
+  on a writer.
+
+The backend is chosen with the ``GALLERY_STORAGE`` environment variable, e.g.
+``sqlite:///gallery.db`` or ``json:///artwork_database.json``. A JSON
+database can be migrated once with::
+
+    python storage.py migrate artwork_database.json gallery.db
+"""
+import json
+import os
+import re
+import sys
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DEFAULT_JSON_PATH = "artwork_database.json"
+
+# Journal size (bytes) at which saved designs are folded back into the JSON snapshot
+COMPACT_THRESHOLD = 1 << 20
+
+# Catalog fields copied into their own (indexed) columns; the full record is kept as JSON
+ARTWORK_COLUMNS = ("title", "artist", "width", "height", "frame_width", "image_path", "style", "price")
+DESIGN_COLUMNS = ("name", "created_date", "total_cost")
+# SQL ordering of each design sort field, matching DesignIndex and served by the design indexes
+DESIGN_SORT_COLUMNS = {"created_date": "created_date", "name": "name COLLATE NOCASE", "total_cost": "total_cost"}
+# Sort key columns of search results, which are sorted in Python
+DESIGN_SEARCH_KEYS = {"created_date": "COALESCE(created_date, '')", "name": "COALESCE(name, '')",
+                      "total_cost": "COALESCE(total_cost, 0)"}
+
+
+class JsonStorage:
+    """Catalog and designs in a JSON snapshot plus an append-only design journal
+
+    Saving a design appends one JSON line to the journal and fsyncs it, so
+    its cost does not depend on how many designs exist. Loading replays the
+    journal on top of the snapshot. Once the journal grows past
+    ``compact_threshold`` bytes a background thread folds it into the
+    snapshot: the journal is renamed aside (under an exclusive lock that
+    appenders share), merged, and the snapshot is atomically replaced.
+    """
+
+    def __init__(self, path=DEFAULT_JSON_PATH, compact_threshold=COMPACT_THRESHOLD):
+        self.path = path
+        base = os.path.splitext(path)[0]
+        self.journal_path = base + ".journal.jsonl"
+        self.compacting_path = base + ".journal.compacting.jsonl"
+        self.compact_threshold = compact_threshold
+        self._compactor = None
+        self._compactor_lock = threading.Lock()
+        # In-process DesignIndex, caught up with the journal on every design query
+        self._index_lock = threading.Lock()
+        self._index = None
+        self._index_version = None
+        self._index_snapshot = None
+        self._index_journal = (None, 0)  # (inode, bytes read) of the journal
+        if os.path.exists(self.journal_path) and os.path.getsize(self.journal_path) >= compact_threshold:
+            self.compact_in_background()
+
+    def catalog_version(self):
+        """Cheap token that changes whenever the catalog may have changed, in any process
+
+        Saving a design only appends to the journal, so it leaves this token
+        alone; compaction rewrites the snapshot and does change it.
+        """
+        return self._stat_token((self.path,))
+
+    def designs_version(self):
+        """Cheap token that changes whenever the snapshot or journal changes, in any process"""
+        return self._stat_token((self.path, self.compacting_path, self.journal_path))
+
+    def _stat_token(self, paths):
+        parts = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                parts.append("-")
+            else:
+                parts.append(f"{st.st_ino}:{st.st_mtime_ns}:{st.st_size}")
+        return "|".join(parts)
+
+    def load(self):
+        data = self._read_snapshot()
+        designs = data.setdefault("gallery_designs", [])
+        seen = {design.get("id") for design in designs}
+        for path in (self.compacting_path, self.journal_path):
+            for design in _read_journal(path):
+                if design.get("id") not in seen:
+                    seen.add(design.get("id"))
+                    designs.append(design)
+        return data
+
+    def load_artworks(self):
+        return self._read_snapshot().get("artworks", [])
+
+    def iter_designs(self):
+        """Saved designs one at a time: the snapshot's, then journaled ones"""
+        seen = set()
+        for design in self._read_snapshot().get("gallery_designs", []):
+            seen.add(design.get("id"))
+            yield design
+        for path in (self.compacting_path, self.journal_path):
+            for design in _read_journal(path):
+                if design.get("id") not in seen:
+                    seen.add(design.get("id"))
+                    yield design
+
+    def page_designs(self, text=None, sort="created_date", descending=True, page=0, page_size=20):
+        """One page of saved designs, as (designs, number matching); see DesignIndex.page"""
+        with self._index_lock:
+            return self._design_index().page(text, sort, descending, page, page_size)
+
+    def get_design(self, design_id):
+        """A saved design by id, or None"""
+        with self._index_lock:
+            return self._design_index().by_id.get(design_id)
+
+    def count_designs(self):
+        """Number of saved designs"""
+        with self._index_lock:
+            return len(self._design_index())
+
+    def _design_index(self):
+        """The DesignIndex of all saved designs, brought up to date; call with _index_lock held
+
+        Designs appended to the journal since the last call are read from
+        where that call stopped and added to the index. Only a rewritten
+        snapshot (a compaction or a full save) rebuilds it.
+        """
+        version = self.designs_version()
+        if version == self._index_version:
+            return self._index
+        from designs import DesignIndex
+
+        snapshot = self._stat_token((self.path, self.compacting_path))
+        if self._index is None or snapshot != self._index_snapshot:
+            designs = self._read_snapshot().get("gallery_designs", [])
+            designs.extend(_read_journal(self.compacting_path))
+            self._index = DesignIndex(designs)
+            self._index_snapshot = snapshot
+            self._index_journal = (None, 0)
+        designs, inode, offset = _tail_journal(self.journal_path, *self._index_journal)
+        self._index_journal = (inode, offset)
+        for design in designs:
+            self._index.add(design)
+        self._index_version = version
+        return self._index
+
+    def save(self, data):
+        # A full save replaces the snapshot and supersedes any journaled designs
+        with _file_lock(self.path + ".compact.lock"), _file_lock(self.journal_path + ".lock"):
+            self._write_snapshot(data)
+            for path in (self.journal_path, self.compacting_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def add_design(self, design):
+        line = (json.dumps(design) + "\n").encode()
+        with _file_lock(self.journal_path + ".lock", shared=True):
+            fd = os.open(self.journal_path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                # Start on a fresh line if a crashed writer left a torn record behind
+                size = os.fstat(fd).st_size
+                if size and hasattr(os, "pread") and os.pread(fd, 1, size - 1) != b"\n":
+                    line = b"\n" + line
+                os.write(fd, line)
+                os.fsync(fd)
+                journal_size = os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+        if journal_size >= self.compact_threshold:
+            self.compact_in_background()
+
+    def compact_in_background(self):
+        """Start a compaction thread unless one is already running in this process"""
+        with self._compactor_lock:
+            if self._compactor is None or not self._compactor.is_alive():
+                self._compactor = threading.Thread(target=self.compact, name="journal-compaction", daemon=True)
+                self._compactor.start()
+
+    def compact(self):
+        """Merge journaled designs into the snapshot; returns False if another compaction is running"""
+        with _file_lock(self.path + ".compact.lock", blocking=False) as acquired:
+            if not acquired:
+                return False
+            # A leftover compacting file means an earlier compaction was interrupted
+            if not os.path.exists(self.compacting_path):
+                if not os.path.exists(self.journal_path):
+                    return True
+                with _file_lock(self.journal_path + ".lock"):
+                    os.replace(self.journal_path, self.compacting_path)
+            data = self._read_snapshot()
+            designs = data.setdefault("gallery_designs", [])
+            seen = {design.get("id") for design in designs}
+            for design in _read_journal(self.compacting_path):
+                if design.get("id") not in seen:
+                    seen.add(design.get("id"))
+                    designs.append(design)
+            self._write_snapshot(data)
+            os.remove(self.compacting_path)
+            return True
+
+    def _read_snapshot(self):
+        with open(self.path, "r") as f:
+            return json.load(f)
+
+    def _write_snapshot(self, data):
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+def _read_journal(path):
+    """Yield the records of a JSONL journal, skipping a torn final line"""
+    if not os.path.exists(path):
+        return
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def _tail_journal(path, inode=None, offset=0):
+    """Records appended to a JSONL journal since offset, as (records, inode, offset after them)
+
+    Reading starts over from the beginning when the journal was replaced
+    (another inode) or truncated. A final line without its newline is left
+    for a later call; a torn line that never completes is skipped.
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return [], None, 0
+    records = []
+    with f:
+        stat = os.fstat(f.fileno())
+        if stat.st_ino != inode or stat.st_size < offset:
+            inode, offset = stat.st_ino, 0
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records, inode, offset
+
+
+@contextmanager
+def _file_lock(path, shared=False, blocking=True):
+    """Advisory inter-process lock on a lock file; yields whether it was acquired
+
+    Without fcntl (Windows) this degrades to no locking.
+    """
+    if fcntl is None:
+        yield True
+        return
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        flags = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        if not blocking:
+            flags |= fcntl.LOCK_NB
+        try:
+            fcntl.flock(fd, flags)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+class SqliteStorage:
+    """Catalog and designs in indexed SQLite tables"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS artworks (
+            id INTEGER PRIMARY KEY,
+            title TEXT,
+            artist TEXT,
+            width REAL,
+            height REAL,
+            frame_width REAL,
+            image_path TEXT,
+            style TEXT,
+            price REAL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_artworks_style ON artworks (style);
+        CREATE INDEX IF NOT EXISTS idx_artworks_artist ON artworks (artist);
+        CREATE INDEX IF NOT EXISTS idx_artworks_price ON artworks (price);
+
+        CREATE TABLE IF NOT EXISTS gallery_designs (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            id TEXT NOT NULL UNIQUE,
+            name TEXT,
+            created_date TEXT,
+            total_cost REAL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_designs_name ON gallery_designs (name);
+        CREATE INDEX IF NOT EXISTS idx_designs_name_nocase ON gallery_designs (name COLLATE NOCASE);
+        CREATE INDEX IF NOT EXISTS idx_designs_created_date ON gallery_designs (created_date);
+        CREATE INDEX IF NOT EXISTS idx_designs_total_cost ON gallery_designs (total_cost);
+
+        -- a table's generation is bumped in every write transaction that changes
+        -- it, so readers in any process can tell whether their cached copy is stale
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        INSERT OR IGNORE INTO meta (key, value) VALUES ('artworks_generation', 0);
+        INSERT OR IGNORE INTO meta (key, value) VALUES ('designs_generation', 0);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _connect(self):
+        # sqlite3 connections must stay on the thread that opened them, and
+        # Streamlit runs each session's script on its own thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            import sqlite3  # only the SQLite backend pays for it
+
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def catalog_version(self):
+        """Write generation of the artworks table, shared by every connection to the database"""
+        return self._generation("artworks")
+
+    def designs_version(self):
+        """Write generation of the designs table, shared by every connection to the database"""
+        return self._generation("designs")
+
+    def _generation(self, table):
+        row = self._connect().execute("SELECT value FROM meta WHERE key = ?", (f"{table}_generation",)).fetchone()
+        return f"generation:{row[0]}"
+
+    def load(self):
+        conn = self._connect()
+        artworks = [json.loads(row[0]) for row in conn.execute("SELECT data FROM artworks ORDER BY id")]
+        designs = [json.loads(row[0]) for row in conn.execute("SELECT data FROM gallery_designs ORDER BY seq")]
+        return {"artworks": artworks, "gallery_designs": designs}
+
+    def load_artworks(self):
+        return [json.loads(row[0]) for row in self._connect().execute("SELECT data FROM artworks ORDER BY id")]
+
+    def iter_designs(self):
+        """Saved designs one at a time, streamed from a cursor"""
+        import sqlite3
+
+        # A private connection, so other queries on this thread cannot disturb the cursor
+        conn = sqlite3.connect(self.path)
+        try:
+            for (data,) in conn.execute("SELECT data FROM gallery_designs ORDER BY seq"):
+                yield json.loads(data)
+        finally:
+            conn.close()
+
+    def page_designs(self, text=None, sort="created_date", descending=True, page=0, page_size=20):
+        """One page of saved designs, as (designs, number matching); see DesignIndex.page
+
+        Pages come straight from the sort column's index. A search first
+        narrows the rows with LIKE, then checks the candidates' name words by
+        prefix as DesignIndex does and sorts the matches; only the records on
+        the page are loaded.
+        """
+        from catalog import tokenize
+
+        order = DESIGN_SORT_COLUMNS[sort]
+        direction = "DESC" if descending else "ASC"
+        conn = self._connect()
+        tokens = tokenize(text) if text else []
+        if not tokens:
+            rows = conn.execute(
+                f"SELECT data FROM gallery_designs ORDER BY {order} {direction}, seq {direction} LIMIT ? OFFSET ?",
+                (page_size, page * page_size),
+            )
+            return [json.loads(data) for (data,) in rows], self.count_designs()
+
+        # LIKE only folds ASCII case, so other tokens are left to the word check
+        like = [token for token in tokens if token.isascii()]
+        where = " AND ".join("name LIKE ? ESCAPE '\\'" for _ in like) or "1"
+        # Tokens are \w+ runs, so "_" is the only LIKE wildcard they can hold
+        params = ["%" + token.replace("_", "\\_") + "%" for token in like]
+        # A word of the name starts with each token, as with tokenize()
+        patterns = [re.compile(r"\b" + re.escape(token)) for token in tokens]
+        # A plain table scan; walking the sort index would visit the rows in random order
+        rows = conn.execute(f"SELECT {DESIGN_SEARCH_KEYS[sort]}, seq, name FROM gallery_designs WHERE {where}", params)
+        matches = sorted(
+            ((key.casefold() if sort == "name" else key), seq)
+            for key, seq, name in rows
+            if all(pattern.search((name or "").lower()) for pattern in patterns)
+        )
+        if descending:
+            matches.reverse()
+        seqs = [seq for _, seq in matches[page * page_size:(page + 1) * page_size]]
+        records = dict(conn.execute(
+            f"SELECT seq, data FROM gallery_designs WHERE seq IN ({', '.join('?' for _ in seqs)})", seqs
+        )) if seqs else {}
+        return [json.loads(records[seq]) for seq in seqs], len(matches)
+
+    def get_design(self, design_id):
+        """A saved design by id, or None"""
+        row = self._connect().execute("SELECT data FROM gallery_designs WHERE id = ?", (design_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def count_designs(self):
+        """Number of saved designs, counted once per designs generation"""
+        version = self.designs_version()
+        cached = getattr(self._local, "design_count", None)
+        if cached is None or cached[0] != version:
+            count = self._connect().execute("SELECT count(*) FROM gallery_designs").fetchone()[0]
+            cached = self._local.design_count = (version, count)
+        return cached[1]
+
+    def save(self, data):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM artworks")
+            conn.execute("DELETE FROM gallery_designs")
+            self._insert_artworks(conn, data.get("artworks", []))
+            self._insert_designs(conn, data.get("gallery_designs", []))
+            self._bump_generation(conn, "artworks")
+            self._bump_generation(conn, "designs")
+
+    def add_design(self, design):
+        with self._connect() as conn:
+            self._insert_designs(conn, [design])
+            self._bump_generation(conn, "designs")
+
+    def _bump_generation(self, conn, table):
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = ?", (f"{table}_generation",))
+
+    def _insert_artworks(self, conn, artworks):
+        conn.executemany(
+            f"INSERT OR REPLACE INTO artworks (id, {', '.join(ARTWORK_COLUMNS)}, data) "
+            f"VALUES (?, {', '.join('?' for _ in ARTWORK_COLUMNS)}, ?)",
+            ([artwork["id"], *(artwork.get(column) for column in ARTWORK_COLUMNS), json.dumps(artwork)]
+             for artwork in artworks),
+        )
+
+    def _insert_designs(self, conn, designs):
+        conn.executemany(
+            f"INSERT OR REPLACE INTO gallery_designs (id, {', '.join(DESIGN_COLUMNS)}, data) "
+            f"VALUES (?, {', '.join('?' for _ in DESIGN_COLUMNS)}, ?)",
+            ([design["id"], *(design.get(column) for column in DESIGN_COLUMNS), json.dumps(design)]
+             for design in designs),
+        )
+
+
+def open_storage(url):
+    """Open a storage backend from a URL such as sqlite:///gallery.db or json:///artwork_database.json
+
+    As with SQLAlchemy URLs, three slashes give a relative path and four an
+    absolute one; a bare path picks the backend from its extension.
+    """
+    scheme, _, path = url.partition("://")
+    if not path:
+        scheme, path = "", url
+    elif path.startswith("/"):
+        path = path[1:]
+    if scheme == "sqlite" or (not scheme and path.endswith((".db", ".sqlite", ".sqlite3"))):
+        return SqliteStorage(path)
+    if scheme in ("json", ""):
+        return JsonStorage(path)
+    raise ValueError(f"Unsupported storage URL: {url}")
+
+
+_storages = {}
+_storages_lock = threading.Lock()
+
+
+def get_storage(url=None):
+    """Shared storage backend for the configured (or given) URL"""
+    url = url or os.environ.get("GALLERY_STORAGE", DEFAULT_JSON_PATH)
+    with _storages_lock:
+        if url not in _storages:
+            _storages[url] = open_storage(url)
+        return _storages[url]
+
+
+def migrate_json_to_sqlite(json_path, sqlite_path):
+    """One-shot copy of a JSON database into a SQLite database; returns (artworks, designs) counts"""
+    data = JsonStorage(json_path).load()
+    target = SqliteStorage(sqlite_path)
+    target.save(data)
+    return len(data.get("artworks", [])), len(data.get("gallery_designs", []))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "migrate":
+        sys.exit("usage: python storage.py migrate <database.json> <database.db>")
+    artwork_count, design_count = migrate_json_to_sqlite(sys.argv[2], sys.argv[3])
+    print(f"Migrated {artwork_count} artworks and {design_count} designs to {sys.argv[3]}")
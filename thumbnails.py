@@ -0,0 +1,96 @@
+"""Pre-generated, content-addressed thumbnail variants for artwork images."""
+import hashlib
+import os
+import threading
+
+THUMBNAIL_DIR = os.environ.get("GALLERY_THUMBNAIL_DIR", ".thumbnails")
+
+# Box sizes are twice the on-screen size so tiles stay sharp on high-DPI screens.
+# "crop" variants are cut to the exact box (the palette tile uses object-fit: cover),
+# the others keep their aspect ratio and only shrink to fit. The wall shows the
+# smallest "wall" variant that is sharp at its current zoom (see WALL_VARIANTS).
+VARIANTS = {
+    "palette": {"size": (240, 180), "crop": True},
+    "wall_small": {"size": (128, 128), "crop": False},
+    "wall": {"size": (400, 400), "crop": False},
+    "wall_large": {"size": (1200, 1200), "crop": False},
+}
+WALL_VARIANTS = {name: max(VARIANTS[name]["size"]) for name in ("wall_small", "wall", "wall_large")}
+
+MIME_TYPES = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".webp": "image/webp",
+    ".gif": "image/gif",
+}
+
+
+def guess_mime(path):
+    """Guess an image MIME type from its file extension"""
+    return MIME_TYPES.get(os.path.splitext(path)[1].lower(), "application/octet-stream")
+
+
+def file_hash(path):
+    """SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _output_format():
+    from PIL import features
+    return ("WEBP", ".webp") if features.check("webp") else ("JPEG", ".jpg")
+
+
+def build_thumbnail(image_path, variant, digest=None):
+    """Write one variant of an image into the thumbnail cache and return its path"""
+    from PIL import Image, ImageOps
+
+    spec = VARIANTS[variant]
+    fmt, ext = _output_format()
+    digest = digest or file_hash(image_path)
+    width, height = spec["size"]
+    out_path = os.path.join(THUMBNAIL_DIR, f"{digest[:32]}-{variant}-{width}x{height}{ext}")
+    if os.path.exists(out_path):
+        return out_path
+
+    with Image.open(image_path) as img:
+        img = ImageOps.exif_transpose(img)
+        if spec["crop"]:
+            img = ImageOps.fit(img, spec["size"], Image.LANCZOS)
+        else:
+            img = img.copy()
+            img.thumbnail(spec["size"], Image.LANCZOS)
+        if fmt == "JPEG" or img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if fmt == "WEBP" and "A" in img.getbands() else "RGB")
+
+        os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+        # Write to a temporary name first so concurrent sessions never read a partial file;
+        # sessions are threads of one process, so the name includes the thread
+        tmp_path = f"{out_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        if fmt == "WEBP":
+            img.save(tmp_path, fmt, quality=82, method=4)
+        else:
+            img.save(tmp_path, fmt, quality=82, optimize=True)
+        os.replace(tmp_path, out_path)
+    return out_path
+
+
+def get_thumbnail(image_path, variant, digest=None):
+    """Return (path, mime) of a cached thumbnail variant, building it on first use.
+
+    Falls back to the original file when Pillow is not installed or the image
+    cannot be decoded, and returns None when the source file does not exist.
+    A caller that passes the file's digest (e.g. from the asset manifest)
+    vouches that it exists, and the file is not hashed again.
+    """
+    if digest is None and not os.path.exists(image_path):
+        return None
+    try:
+        path = build_thumbnail(image_path, variant, digest)
+    except (ImportError, OSError):
+        return image_path, guess_mime(image_path)
+    return path, guess_mime(path)
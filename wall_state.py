@@ -0,0 +1,85 @@
+"""Server side of the wall component's delta sync protocol.
+
+The component never sends the wall itself. Each interaction becomes an
+operation with a sequence number:
+
+- ``{"op": "add", "seq": n, "id": artwork id, "x": x, "y": y}``
+- ``{"op": "move", "seq": n, "id": artwork id, "x": x, "y": y}``
+- ``{"op": "remove", "seq": n, "id": artwork id}``
+- ``{"op": "clear", "seq": n}``
+- ``{"op": "sync", "seq": n}``, sent by a freshly mounted component that has
+  no wall yet
+
+The component value is ``{"seq": last seq, "ops": [unacknowledged ops]}``.
+Python applies the ops newer than the last acknowledged seq to the session's
+wall and sends that seq back as ``ack``, and the component then drops the
+acknowledged ops. The full wall is sent only when the server changed it
+(Auto-Arrange, Load, ...), detected by comparing ``wall_version`` with the
+version the component is known to hold.
+"""
+import hashlib
+import json
+
+
+def wall_version(artworks):
+    """Short hash of the wall's pieces and positions"""
+    placements = [[artwork["id"], artwork.get("wall_x", 0), artwork.get("wall_y", 0)] for artwork in artworks]
+    return hashlib.sha1(json.dumps(placements).encode()).hexdigest()[:16]
+
+
+def apply_patch(artworks, patch, catalog_by_id, acked_seq=0, changes=None):
+    """Apply the ops of a component patch newer than acked_seq to artworks in place
+
+    catalog_by_id maps artwork id -> catalog dict, used for ``add``. When a
+    changes list is given, each applied op appends its undo history changes,
+    ``(artwork, before, after)`` as in ``history``, in the order made. Returns
+    (last seq applied, whether the component asked for a full resync).
+    """
+    seq = acked_seq
+    sync = False
+    positions = None
+    for op in patch.get("ops", ()):
+        if op.get("seq", 0) <= seq:
+            continue
+        seq = op["seq"]
+        kind = op.get("op")
+        if kind == "sync":
+            sync = True
+            continue
+        if kind == "clear":
+            if changes is not None:
+                changes.extend(
+                    (artwork, (i, artwork.get("wall_x", 0), artwork.get("wall_y", 0)), None)
+                    for i, artwork in reversed(list(enumerate(artworks)))
+                )
+            artworks.clear()
+            positions = None
+            continue
+
+        if positions is None:
+            positions = {artwork["id"]: i for i, artwork in enumerate(artworks)}
+        key = op.get("id")
+        if kind == "add":
+            if key in positions or key not in catalog_by_id:
+                continue
+            positions[key] = len(artworks)
+            artworks.append(dict(catalog_by_id[key], wall_x=op["x"], wall_y=op["y"]))
+            if changes is not None:
+                changes.append((artworks[-1], None, (positions[key], op["x"], op["y"])))
+        elif kind == "move":
+            if key in positions:
+                index = positions[key]
+                artwork = artworks[index]
+                before = (index, artwork.get("wall_x", 0), artwork.get("wall_y", 0))
+                artwork["wall_x"], artwork["wall_y"] = op["x"], op["y"]
+                if changes is not None and before[1:] != (op["x"], op["y"]):
+                    changes.append((artwork, before, (index, op["x"], op["y"])))
+        elif kind == "remove":
+            if key in positions:
+                index = positions.pop(key)
+                if changes is not None:
+                    artwork = artworks[index]
+                    changes.append((artwork, (index, artwork.get("wall_x", 0), artwork.get("wall_y", 0)), None))
+                del artworks[index]
+                positions = None
+    return seq, sync